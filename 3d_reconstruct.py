@@ -1,15 +1,20 @@
 # -*- coding: utf-8 -*-
 import sys
-import cv2
-import numpy as np
 from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout
 from PyQt5.QtCore import QTimer
 from PyQt5.QtGui import QImage, QPixmap
 import pyqtgraph.opengl as gl
-from skimage.measure import marching_cubes
-from scipy.ndimage import binary_closing, binary_opening
+from reconstruct import build_stages
+from recon_worker import WorkerSlot
+from metrics import Metrics
+from camera import CameraThread
 
 face_names = ['front', 'back', 'left', 'right', 'top', 'bottom']
+VOXEL_N = 96  # 分辨率，越大越精细但越慢
+SPARSE_CARVE = False  # 分层稀疏雕刻+分块 marching cubes，开启后分辨率可以到 1024
+MESH_BUDGET = 100000  # 送给 GLMeshItem 的三角形上限，超出时简化网格
+METRICS = False  # 每次重建完成后在终端打印各阶段耗时和计数（图片、体素、点、三角形）
+PROFILE = None  # 给出文件名（如 'recon.prof'）时用 cProfile 采样重建线程
 
 class MainWindow(QWidget):
     def __init__(self):
@@ -27,11 +32,17 @@ class MainWindow(QWidget):
         self.btn_voxel = QPushButton("体素重建并展示")
         self.btn_voxel.setEnabled(False)
         self.btn_voxel.clicked.connect(self.voxel_reconstruct)
+        self.btn_cancel = QPushButton("取消重建")
+        self.btn_cancel.setEnabled(False)
+        self.btn_cancel.clicked.connect(self.cancel_reconstruct)
+        self.status_label = QLabel()
 
         vbox_left = QVBoxLayout()
         vbox_left.addWidget(self.cam_label)
         vbox_left.addWidget(self.btn_capture)
         vbox_left.addWidget(self.btn_voxel)
+        vbox_left.addWidget(self.btn_cancel)
+        vbox_left.addWidget(self.status_label)
         vbox_left.addStretch(1)
 
         # 右侧3D网格展示区
@@ -50,25 +61,32 @@ class MainWindow(QWidget):
         hbox.addLayout(vbox_right)
         self.setLayout(hbox)
 
-        # 摄像头定时器
-        self.cap = cv2.VideoCapture(0)
+        # 重建在后台线程进行，预览定时器不会被卡住
+        self.recon = WorkerSlot(self.on_progress, self.show_mesh, self.on_failed, self)
+
+        # 摄像头在后台线程读取，定时器只负责刷新预览
+        self.camera = CameraThread(0, preview_size=(400, 300))
+        self.camera.start()
+        self.preview_seq = 0
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
         self.timer.start(30)
 
     def update_frame(self):
-        ret, frame = self.cap.read()
-        if ret:
-            img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # 预览已在采集线程中缩小并转成 RGB，这里直接包成 QImage，没有新帧时跳过
+        with self.camera.preview() as (img_rgb, seq):
+            if img_rgb is None or seq == self.preview_seq:
+                return
             h, w, ch = img_rgb.shape
-            qt_img = QImage(img_rgb.data, w, h, ch*w, QImage.Format_RGB888)
-            pixmap = QPixmap.fromImage(qt_img).scaled(400, 300, aspectRatioMode=1)
-            self.cam_label.setPixmap(pixmap)
-            self.current_frame = frame
+            qt_img = QImage(img_rgb.data, w, h, img_rgb.strides[0], QImage.Format_RGB888)
+            self.cam_label.setPixmap(QPixmap.fromImage(qt_img))
+            self.preview_seq = seq
 
     def capture_face(self):
-        if hasattr(self, 'current_frame'):
-            self.images[self.current_face] = self.current_frame.copy()
+        # 直接取缓冲区中最新的一帧，不等待摄像头
+        frame = self.camera.latest()
+        if frame is not None:
+            self.images[self.current_face] = frame
             self.current_face += 1
             if self.current_face < 6:
                 self.btn_capture.setText("拍摄 {}面".format(face_names[self.current_face]))
@@ -76,42 +94,42 @@ class MainWindow(QWidget):
                 self.btn_capture.setEnabled(False)
                 self.btn_voxel.setEnabled(True)
 
-    def get_mask(self, img):
-        # 智能抠图：自动阈值+形态学+平滑
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        # OTSU自动阈值
-        _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        # 闭运算填补小孔
-        kernel = np.ones((5,5), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-        # 开运算去除小噪点
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-        # 边缘平滑
-        mask = cv2.GaussianBlur(mask, (3,3), 0)
-        return (mask > 127).astype(np.uint8)
-
     def voxel_reconstruct(self):
-        N = 96  # 分辨率，越大越精细但越慢
-        voxel = np.ones((N, N, N), dtype=bool)
-        masks = []
-        for img in self.images:
-            img = cv2.resize(img, (N, N))
-            mask = self.get_mask(img)
-            masks.append(mask)
-        for z in range(N):
-            voxel[:, :, z] &= masks[0][:, z].astype(bool)
-            voxel[:, :, z] &= masks[1][:, N-1-z].astype(bool)
-        for x in range(N):
-            voxel[x, :, :] &= masks[2][:, x].astype(bool)[:, None]
-            voxel[x, :, :] &= masks[3][:, N-1-x].astype(bool)[:, None]
-        for y in range(N):
-            voxel[:, y, :] &= masks[4][y, :].astype(bool)
-            voxel[:, y, :] &= masks[5][N-1-y, :].astype(bool)
-        # 三维形态学平滑
-        voxel = binary_closing(voxel, structure=np.ones((3,3,3)))
-        voxel = binary_opening(voxel, structure=np.ones((3,3,3)))
-        # marching cubes重建网格
-        verts, faces, normals, values = marching_cubes(voxel, level=0.5, spacing=(1.0/N, 1.0/N, 1.0/N))
+        # 重建过程中再次点击会取消当前任务并用最新的照片重新开始
+        # 抠图、雕刻、平滑、分块 marching cubes、简化到三角形预算内，见 reconstruct.py
+        # 稠密网格只在小分辨率下用，进程池的启动开销超过并行收益，网格阶段单进程做；
+        # 稀疏雕刻是给高分辨率用的，分块网格交给进程池（spawn 启动，见 meshing.py）
+        stages = build_stages(VOXEL_N, mode='mesh', mask='otsu', sparse=SPARSE_CARVE, budget=MESH_BUDGET,
+                              mesh_workers=None if SPARSE_CARVE else 1)
+        self.metrics = Metrics(enabled=METRICS, profile=PROFILE)
+        self.recon.start(stages, list(self.images), self.metrics)
+        self.btn_cancel.setEnabled(True)
+        # 重建的同时可以拍下一组，新照片不影响正在进行的重建；
+        # 六面拍齐之前不能再点重建，否则会把上一组和这一组的照片混在一起
+        self.images = [None]*6
+        self.current_face = 0
+        self.btn_voxel.setEnabled(False)
+        self.btn_capture.setText("重新拍摄 {}面".format(face_names[self.current_face]))
+        self.btn_capture.setEnabled(True)
+
+    def cancel_reconstruct(self):
+        self.recon.cancel()
+        self.btn_cancel.setEnabled(False)
+        self.status_label.setText("已取消")
+
+    def on_progress(self, i, total, name):
+        self.status_label.setText("重建中 {}/{}：{}".format(i, total, name))
+
+    def on_failed(self, msg):
+        self.btn_cancel.setEnabled(False)
+        self.status_label.setText("重建失败：" + msg)
+
+    def show_mesh(self, mesh):
+        self.btn_cancel.setEnabled(False)
+        self.status_label.setText("重建完成")
+        if self.metrics.enabled:
+            print(self.metrics.summary())
+        verts, faces = mesh
         verts = verts - 0.5  # 居中
         # 清除旧网格
         if self.mesh_item:
@@ -120,6 +138,11 @@ class MainWindow(QWidget):
         self.gl_widget.addItem(mesh)
         self.mesh_item = mesh
 
+    def closeEvent(self, event):
+        self.recon.shutdown()
+        self.camera.stop()
+        super().closeEvent(event)
+
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     win = MainWindow()
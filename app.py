@@ -1,118 +1,261 @@
-import requests
+import argparse
+import atexit
 import os
-import cv2
-import numpy as np
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from pointcloud import is_image_file, read_frame, REDUCE_FACTORS, batch_points, normalize_points, stream_points, image_points
+from downloader import make_session, fetch_file, download_files, download_archive, in_order
+from imgcache import ImageCache
+from pointcloud_io import write_points
+from preview import render_preview
+from metrics import Metrics
+from changefeed import FeedClient
+from pointstore import PointStore, params_tag
 
-def get_largest_object_mask(gray, threshold=30):
-    _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)
-    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary, connectivity=8)
-    if num_labels <= 1:
-        return np.zeros_like(gray, dtype=bool)
-    largest_label = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
-    mask = (labels == largest_label)
-    return mask
+parser = argparse.ArgumentParser(description="从存储服务器下载图片并生成点云")
+parser.add_argument('--server', default="http://127.0.0.1:5001", help="web.py 服务地址")
+parser.add_argument('--workers', type=int, default=4, help="并发下载线程数")
+parser.add_argument('--retries', type=int, default=3, help="单个请求失败重试次数")
+parser.add_argument('--output', default='points.csv', help="点云输出文件，按扩展名选择格式：.csv/.ply/.npy/.npz")
+parser.add_argument('--stream', action='store_true', help="两遍流式处理，内存占用与图片总数无关")
+parser.add_argument('--scale', type=float, help="向服务端请求按比例缩小的图片(0~1]，采样步长按同一比例缩小")
+parser.add_argument('--archive', action='store_true', help="未缓存的图片打成一个 tar 流一次取回，支持断点续传")
+parser.add_argument('--cache-mb', type=int, default=1024, help="本地图片缓存容量上限(MB)")
+parser.add_argument('--reduce', type=int, choices=REDUCE_FACTORS, default=1,
+                    help="按 1/2、1/4、1/8 分辨率解码并在小图上抠图，不超过采样步长；"
+                         "坐标网格不变，但小图上的 mask 略有不同，点集是近似结果")
+parser.add_argument('--preview', choices=('png', 'matplotlib', 'none'), default='png',
+                    help="png：NumPy 渲染预览图，不需要图形界面；matplotlib：原来的可交互 3D 散点图")
+parser.add_argument('--metrics', action='store_true', help="结束时打印各阶段耗时和计数（字节、图片、点）")
+parser.add_argument('--profile', metavar='FILE', help="用 cProfile 采样下载和生成过程，结果写到 FILE（.prof）")
+parser.add_argument('--follow', action='store_true',
+                    help="处理完现有图片后继续订阅服务端变更，只处理新上传的图片，按 Ctrl+C 结束")
+args = parser.parse_args()
+if args.archive and args.scale:
+    parser.error("--archive 只传输原图，不能与 --scale 同时使用")
+if args.follow and (args.archive or args.stream or args.preview == 'matplotlib'):
+    parser.error("--follow 不能与 --archive、--stream、--preview matplotlib 同时使用")
 
-# 只处理这些后缀的图片
-ALLOWED_EXTS = {'.jpg', '.jpeg', '.png', '.bmp'}
-def is_image_file(fname):
-    return os.path.splitext(fname)[1].lower() in ALLOWED_EXTS
-
-img_list_url = "http://127.0.0.1:5001/api/list"
-img_base_url = "http://127.0.0.1:5001/api/download/"
+img_list_url = args.server + "/api/list"
+img_base_url = args.server + "/api/download/"
 download_dir = "downloaded_imgs"
-os.makedirs(download_dir, exist_ok=True)
+cache = ImageCache(download_dir, max_bytes=args.cache_mb * 1024 * 1024)
+# 未开启时各处的 stage/count 都是空操作
+metrics = Metrics(enabled=args.metrics, profile=args.profile)
+
+def report_metrics():
+    metrics.stop_profile()
+    if metrics.enabled:
+        print(metrics.summary())
+atexit.register(report_metrics)
 
-resp = requests.get(img_list_url)
+session = make_session(pool_size=args.workers, retries=args.retries)
+feed = FeedClient(session, args.server)
+if args.follow:
+    # 先记下事件流位置再列目录，列表之后到达的上传不会漏掉
+    try:
+        feed.poll(timeout=0)
+    except Exception as e:
+        print("服务端不支持变更订阅（/api/changes）：", e)
+        exit(1)
+with metrics.stage('列表'):
+    resp = session.get(img_list_url, timeout=30)
+metrics.count('列表字节', len(resp.content))
 try:
-    img_files = [f for f in resp.json()["files"] if is_image_file(f)]
+    listing = resp.json()
+    # 新版服务端在 items 中给出内容哈希，旧版只有文件名
+    entries = listing.get("items") or [{"name": f} for f in listing["files"]]
+    img_files = [e for e in entries if is_image_file(e["name"])]
 except Exception as e:
     print("接口返回内容：", resp.text)
     print("解析JSON失败，报错：", e)
     exit(1)
 
-if not img_files:
+if not img_files and not args.follow:
     print("没有可下载的图片。")
     exit(1)
 
 print("将下载以下图片：")
-for fname in img_files:
-    print(" -", fname)
+for e in img_files:
+    print(" -", e["name"])
 ans = input("是否继续下载并生成点云？(y/n): ")
 if ans.lower() != 'y':
     print("已取消。")
     exit(0)
-
-local_files = []
-for fname in img_files:
-    url = img_base_url + fname
-    local_path = os.path.join(download_dir, fname)
-    with open(local_path, "wb") as f:
-        f.write(requests.get(url).content)
-    local_files.append(local_path)
-print(f"已下载图片: {local_files}")
+metrics.start_profile()
 
 # 2. 生成点云并分批写入CSV
 z_scale = 50.0
 step = 18  # 采样步长调为18，点云稀疏度适中
-points_list = []
-for img_path in local_files:
-    img = cv2.imread(img_path, cv2.IMREAD_UNCHANGED)
-    if img is None: continue
-    if len(img.shape) == 2:
-        gray = img
-        mask = np.ones_like(gray, dtype=bool)
-    elif len(img.shape) == 3 and img.shape[2] == 3:
-        b, g, r = cv2.split(img)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        # 绿色像素点过滤：G通道比R、B都高且高出一定阈值
-        mask = ~((g > r + 30) & (g > b + 30))
-    elif len(img.shape) == 3 and img.shape[2] == 4:
-        b, g, r, a = cv2.split(img)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY)
-        mask = ~((g > r + 30) & (g > b + 30))
-    else:
-        continue
-    # 只保留中心物体
-    object_mask = get_largest_object_mask(gray)
-    mask = mask & object_mask
-    for y in range(0, gray.shape[0], step):
-        for x in range(0, gray.shape[1], step):
-            if not mask[y, x]:
+if args.scale:
+    # 图片缩小后步长同比缩小，采样密度不变；坐标尺度差异在归一化时消除
+    step = max(1, round(step * args.scale))
+# 缩小倍数不超过采样步长，否则相邻采样点会落在小图的同一像素上
+reduce = max(f for f in REDUCE_FACTORS if f <= min(args.reduce, step))
+def iter_frames(downloaded):
+    """(下标, 本地路径) -> (下标, 帧)，下载失败或无法解码的跳过"""
+    # 等待下一张图片下载完成的时间记为“下载”
+    for i, img_path in metrics.timed(downloaded, '下载'):
+        if img_path is None:
+            continue
+        if metrics.enabled:
+            metrics.count('图片字节', os.path.getsize(img_path))
+        with metrics.stage('解码'):
+            frame = read_frame(img_path, reduce)
+        if frame is not None:
+            metrics.count('图片')
+            yield i, frame
+
+def fetch(entry):
+    try:
+        return fetch_file(session, img_base_url + quote(entry["name"]), cache, entry["name"],
+                          entry.get("hash"), scale=args.scale)
+    except Exception as e:
+        print(f"下载失败 {entry['name']}：{e}")
+        return None
+
+def add_images(entries):
+    """把还不在点云库里的图片加进去，同内容已算过的直接复用，返回新增图片数"""
+    todo = []
+    added = 0
+    for e in entries:
+        if e["name"] in store or not is_image_file(e["name"]):
+            continue
+        if store.has(e["hash"]):
+            store.add(e["name"], e["hash"])
+            added += 1
+        else:
+            todo.append(e)
+    # 线程池按顺序返回，下载与前面图片的解码重叠
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for e, path in zip(todo, metrics.timed(pool.map(fetch, todo), '下载')):
+            if path is None:
                 continue
-            y_flip = gray.shape[0] - 1 - y  # y轴翻转
-            z = float(gray[y, x]) / 255.0 * z_scale
-            points_list.append([x, y_flip, z])
+            with metrics.stage('解码'):
+                frame = read_frame(path, reduce)
+            if frame is None:
+                continue
+            metrics.count('图片')
+            with metrics.stage('取点'):
+                store.add(e["name"], e["hash"], image_points(*frame[:2], step, z_scale, *frame[2:]))
+            added += 1
+    return added
+
+def refresh():
+    """保存点云库，用累积统计量归一化后重写输出和预览"""
+    store.save()
+    cache.save_manifest()
+    cache.evict()
+    if store.count == 0:
+        # 服务端清空后旧的输出和预览已经过期，删掉，免得下游还读到清空前的点云
+        for path in (args.output, 'pointcloud_preview.png'):
+            if os.path.exists(path):
+                os.remove(path)
+        print("点云库为空，等待新图片……")
+        return
+    with metrics.stage('导出'):
+        points = store.write(args.output)
+    metrics.count('点', len(points))
+    if args.preview == 'png':
+        with metrics.stage('预览'):
+            render_preview(points, 'pointcloud_preview.png')
+    print(f"[{time.strftime('%H:%M:%S')}] {len(store)} 张图片，{len(points)} 点，已更新 {args.output}")
+
+if args.follow:
+    # 每张图片的原始点存在点云库里，新图片只算自己的点；归一化统计量逐张累积
+    store = PointStore('point_store', params_tag(step, z_scale, reduce, args.scale))
+    store.sync([e["name"] for e in img_files])
+    add_images(img_files)
+    refresh()
+    print("正在等待新上传的图片，按 Ctrl+C 结束……")
+    try:
+        while True:
+            try:
+                events, reset = feed.poll()
+                # 一次上传的多张图片陆续到达，稍等片刻合并成一批处理
+                while events and not reset:
+                    more, reset = feed.poll(timeout=0.3)
+                    if not more:
+                        break
+                    events += more
+            except Exception as e:
+                print("订阅变更失败，稍后重试：", e)
+                time.sleep(3)
+                continue
+            changed = False
+            if reset:
+                # 服务器重启或错过了太多事件：重新列目录对齐
+                listing = session.get(img_list_url, timeout=30).json()
+                entries = [e for e in listing["items"] if is_image_file(e["name"])]
+                changed = store.sync([e["name"] for e in entries])
+                changed = add_images(entries) > 0 or changed
+            new = []
+            for ev in events:
+                if ev["type"] == 'clear':
+                    store.clear()
+                    new = []
+                    changed = True
+                elif ev["type"] == 'upload':
+                    new.append(ev)
+            if new:
+                changed = add_images(new) > 0 or changed
+            if changed:
+                refresh()
+    except KeyboardInterrupt:
+        print("已停止跟随。")
+    exit(0)
 
-points_arr = np.array(points_list)
-if points_arr.shape[0] == 0:
-    print("没有有效点云生成。"); exit(1)
-# 居中归一化到[-100,100]
-center = points_arr.mean(axis=0)
-points_arr -= center
-max_range = np.abs(points_arr).max()
-if max_range > 0:
-    points_arr /= max_range
-    points_arr *= 100
+# 下载完成一张就解码一张，与其余仍在传输的文件重叠；点按列表顺序排列，每次运行输出相同
+if args.archive:
+    downloaded = download_archive(session, args.server + "/api/archive", img_files, cache, retries=args.retries)
+else:
+    downloaded = download_files(session, img_base_url, img_files, cache, workers=args.workers, scale=args.scale)
+if args.stream:
+    # 归一化结果先落到内存映射的 .npy，再按需分块转成其他格式
+    npy_path = args.output if args.output.endswith('.npy') else os.path.splitext(args.output)[0] + '.npy'
+    with metrics.stage('取点'):
+        # 流式写出要求按列表顺序到达，先完成的后面的图片等前面的下完再解码
+        frames = (frame for _, frame in iter_frames(in_order(downloaded)))
+        points_arr = stream_points(frames, npy_path, step=step, z_scale=z_scale)
+    if points_arr is None:
+        print("没有有效点云生成。"); exit(1)
+else:
+    with metrics.stage('取点'):
+        # 先完成的先解码，采样结果最后按下标排回列表顺序
+        points_arr = batch_points(iter_frames(downloaded), step=step, z_scale=z_scale, indexed=True)
+    if points_arr.shape[0] == 0:
+        print("没有有效点云生成。"); exit(1)
+    # 居中归一化到[-100,100]
+    with metrics.stage('归一化'):
+        normalize_points(points_arr)
+metrics.count('点', len(points_arr))
 
-with open('points.csv', 'w') as f:
-    f.write('x,y,z\n')
-    for x, y, z in points_arr:
-        f.write(f"{x},{y},{z}\n")
-print(f'点云已保存为 points.csv，总点数：{len(points_arr)}')
+if not (args.stream and args.output.endswith('.npy')):
+    with metrics.stage('导出'):
+        write_points(args.output, points_arr)
+print(f'点云已保存为 {args.output}，总点数：{len(points_arr)}')
 
-# 3. 生成后立即窗口展示点云（matplotlib 3D）
-# 读取刚生成的点云
+# 3. 生成点云预览图
+# 流式模式下 points_arr 是整个 memmap，只抽样一部分点作图，免得预览把它整个读进内存
 points = points_arr
-fig = plt.figure(figsize=(8,8))
-ax = fig.add_subplot(111, projection='3d')
-sc = ax.scatter(points[:,0], points[:,1], points[:,2], s=2, c=points[:,2], cmap='viridis')
-ax.set_xlabel('X')
-ax.set_ylabel('Y')
-ax.set_zlabel('Z')
-ax.set_title('点云预览')
-plt.tight_layout()
-plt.savefig('pointcloud_preview.png', dpi=200)
-plt.show()
-print("点云展示图已保存为 pointcloud_preview.png") 
\ No newline at end of file
+if args.stream:
+    points = points_arr[::max(1, len(points_arr) // 200000)]
+if args.preview == 'png':
+    # 体素降采样 + z-buffer 圆点渲染，按 z 着色，几十万点也只需不到一秒
+    with metrics.stage('预览'):
+        render_preview(points, 'pointcloud_preview.png')
+    print("点云展示图已保存为 pointcloud_preview.png")
+elif args.preview == 'matplotlib':
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=(8,8))
+    ax = fig.add_subplot(111, projection='3d')
+    sc = ax.scatter(points[:,0], points[:,1], points[:,2], s=2, c=points[:,2], cmap='viridis')
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+    ax.set_zlabel('Z')
+    ax.set_title('点云预览')
+    plt.tight_layout()
+    plt.savefig('pointcloud_preview.png', dpi=200)
+    plt.show()
+    print("点云展示图已保存为 pointcloud_preview.png")
@@ -0,0 +1,65 @@
+import hashlib
+import tarfile
+
+BLOCK = tarfile.BLOCKSIZE
+READ_SIZE = 256 * 1024
+
+class TarStream:
+    """边读文件边生成的 tar 包，不在内存中拼出整个归档
+
+    每个成员的头部预先生成，总长度和各段偏移在开始传输前就确定，
+    所以可以按任意字节区间输出，支持 HTTP Range 断点续传。
+    entries 为 (归档内文件名, 本地路径, 大小, mtime, 内容哈希)。
+    """
+    def __init__(self, entries):
+        self.segments = []  # (起始偏移, 长度, 头部字节或 None, 路径)
+        offset = 0
+        etag = hashlib.sha256()
+        for name, path, size, mtime, digest in entries:
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = int(mtime)
+            info.mode = 0o644
+            header = info.tobuf(format=tarfile.PAX_FORMAT, encoding='utf-8')
+            self.segments.append((offset, len(header), header, None))
+            offset += len(header)
+            padded = -(-size // BLOCK) * BLOCK
+            self.segments.append((offset, padded, size, path))
+            offset += padded
+            etag.update(f'{name}\0{digest}\0'.encode('utf-8'))
+        # 结尾两个空块
+        self.segments.append((offset, 2 * BLOCK, b'\0' * (2 * BLOCK), None))
+        offset += 2 * BLOCK
+        self.length = offset
+        self.etag = etag.hexdigest()
+
+    def iter_range(self, start=0, stop=None):
+        """按 [start, stop) 字节区间产出数据块"""
+        stop = self.length if stop is None else stop
+        for seg_start, seg_len, data, path in self.segments:
+            seg_end = seg_start + seg_len
+            if seg_end <= start or seg_start >= stop:
+                continue
+            lo = max(start, seg_start) - seg_start
+            hi = min(stop, seg_end) - seg_start
+            if path is None:
+                yield data[lo:hi]
+                continue
+            # 文件内容段：data 为文件真实大小，超出部分是补齐到 512 字节的 0
+            size = data
+            pos = lo
+            if pos < size:
+                with open(path, 'rb') as f:
+                    f.seek(pos)
+                    while pos < min(hi, size):
+                        chunk = f.read(min(READ_SIZE, min(hi, size) - pos))
+                        if not chunk:
+                            break
+                        yield chunk
+                        pos += len(chunk)
+                if pos < min(hi, size):
+                    # 文件在传输期间变短，补 0 保持偏移不变
+                    yield b'\0' * (min(hi, size) - pos)
+                    pos = min(hi, size)
+            if pos < hi:
+                yield b'\0' * (hi - max(pos, size))
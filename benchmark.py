@@ -0,0 +1,281 @@
+"""可重复的性能基准：抠图、雕刻、平滑、网格、点云生成和上传服务器
+
+全部使用固定随机种子生成的合成图片，不需要摄像头和真实照片，结果写成 JSON，
+便于在开发板和服务器上、不同提交之间对比：
+
+    python benchmark.py -o bench.json
+    python benchmark.py --only carve,smooth --sizes 64,128 --repeat 3
+
+每项记录多次运行的最短/中位/平均耗时，以及单独一次运行中 tracemalloc
+统计的 Python/NumPy 分配峰值；文件末尾另记整个进程的最大常驻内存
+（Windows 上需要 psutil，没有时为 null）。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块
+    resource = None
+
+from carving import carve, carve_sparse
+from morphology import smooth
+from meshing import marching_cubes_chunked
+from pointcloud import read_frame, batch_points, normalize_points
+from pointcloud_io import write_points
+from reconstruct import mask_threshold, mask_otsu
+
+GROUPS = ('mask', 'carve', 'smooth', 'mesh', 'points', 'web')
+SEED = 20240601
+
+def max_rss_mb():
+    """整个进程的最大常驻内存(MB)；取不到时返回 None"""
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+        return rss / 2**20 if sys.platform == 'darwin' else rss / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    # Windows 上为峰值工作集
+    return getattr(info, 'peak_wset', info.rss) / 2**20
+
+def measure(fn, repeat=5):
+    """预热一次后计时 repeat 次，再单独跑一次统计内存峰值"""
+    fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'repeat': repeat, 'min': min(times), 'median': float(np.median(times)),
+            'mean': float(np.mean(times)), 'peak_mb': peak / 2**20}
+
+# ---------- 合成数据 ----------
+
+def synthetic_masks(n):
+    """六个面的 N*N 轮廓：一个带缺口的椭圆体加侧面把手，各面形状不同"""
+    yy, xx = np.mgrid[:n, :n] / n - 0.5
+    body = (xx / 0.35) ** 2 + (yy / 0.42) ** 2 < 1
+    notch = (np.abs(xx) < 0.06) & (yy < -0.25)
+    handle = (np.abs(yy) < 0.08) & (np.abs(xx) < 0.47)
+    front = body & ~notch
+    side = body | handle
+    top = (xx / 0.35) ** 2 + (yy / 0.35) ** 2 < 1
+    return [m.astype(np.uint8) for m in (front, front, side, side, top, top)]
+
+def synthetic_face(rng, size=(480, 640)):
+    """白底上的深色物体加噪声，两种抠图方法都能处理"""
+    h, w = size
+    img = np.full((h, w, 3), 235, dtype=np.uint8)
+    cv2.ellipse(img, (w // 2, h // 2), (w // 4, h // 3), 15, 0, 360, (60, 50, 40), -1)
+    cv2.circle(img, (w // 2 + w // 5, h // 2), h // 8, (70, 60, 50), -1)
+    noise = rng.normal(0, 6, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+def synthetic_photo(rng, size=(960, 1280)):
+    """app.py 输入的照片：暗背景上的亮物体，带少量绿色像素和背景杂点"""
+    h, w = size
+    img = (rng.random((h, w, 3)) * 20).astype(np.uint8)
+    cv2.ellipse(img, (w // 2, h // 2), (w // 3, h // 3), 0, 0, 360, (180, 170, 160), -1)
+    shade = np.linspace(0.6, 1.0, w, dtype=np.float32)[None, :, None]
+    img = (img * shade).astype(np.uint8)
+    cv2.rectangle(img, (w // 2 - 40, h // 2 - 40), (w // 2 + 40, h // 2 + 40), (30, 200, 30), -1)
+    for _ in range(20):
+        x, y = int(rng.integers(0, w)), int(rng.integers(0, h))
+        cv2.circle(img, (x, y), 4, (120, 120, 120), -1)
+    return img
+
+# ---------- 各组基准 ----------
+
+def bench_mask(results, args, rng):
+    img = synthetic_face(rng)
+    for name, fn in (('threshold', mask_threshold), ('otsu', mask_otsu)):
+        results.append(dict(name=f'mask.{name}', params={'size': list(img.shape[:2])},
+                            **measure(lambda: fn(img), args.repeat)))
+
+def bench_carve(results, args, rng):
+    for n in args.sizes:
+        masks = synthetic_masks(n)
+        for name, fn in (('dense', lambda: carve(masks)),
+                         ('packed', lambda: carve(masks, packed=True)),
+                         ('sparse', lambda: carve_sparse(masks))):
+            results.append(dict(name=f'carve.{name}', params={'n': n},
+                                **measure(fn, args.repeat)))
+
+def bench_smooth(results, args, rng):
+    try:
+        from scipy.ndimage import binary_closing, binary_opening
+    except ImportError:
+        binary_closing = None
+    for n in args.sizes:
+        voxel = carve(synthetic_masks(n))
+        results.append(dict(name='smooth.packed', params={'n': n},
+                            **measure(lambda: smooth(voxel), args.repeat)))
+        if binary_closing is None:
+            continue
+        # 原来 3d_reconstruct.py 中的 scipy 写法，作为对照
+        s = np.ones((3, 3, 3))
+        results.append(dict(name='smooth.scipy', params={'n': n},
+                            **measure(lambda: binary_opening(binary_closing(voxel, structure=s), structure=s),
+                                      args.repeat)))
+
+def bench_mesh(results, args, rng):
+    from skimage.measure import marching_cubes
+    for n in args.sizes:
+        voxel = smooth(carve(synthetic_masks(n)))
+        results.append(dict(name='mesh.skimage', params={'n': n},
+                            **measure(lambda: marching_cubes(voxel, level=0.5), args.repeat)))
+        results.append(dict(name='mesh.chunked', params={'n': n},
+                            **measure(lambda: marching_cubes_chunked(voxel, workers=1), args.repeat)))
+
+def bench_points(results, args, rng):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.photos):
+            p = os.path.join(tmp, f'photo_{i:03d}.jpg')
+            cv2.imwrite(p, synthetic_photo(rng))
+            paths.append(p)
+        def generate(reduce):
+            points = batch_points((read_frame(p, reduce) for p in paths), step=18, z_scale=50.0)
+            return normalize_points(points)
+        for reduce in (1, 4):
+            r = measure(lambda: generate(reduce), args.repeat)
+            r['images_per_s'] = len(paths) / r['median']
+            results.append(dict(name='points.generate', params={'photos': len(paths), 'reduce': reduce}, **r))
+        points = generate(1)
+        out = os.path.join(tmp, 'points.csv')
+        r = measure(lambda: write_points(out, points), args.repeat)
+        r['points_per_s'] = len(points) / r['median']
+        results.append(dict(name='points.csv_write', params={'points': len(points)}, **r))
+
+def bench_web(results, args, rng):
+    import requests
+    from werkzeug.serving import make_server
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # web.py 的存储目录是相对路径，整个测试期间切到临时目录，避免动到真实数据
+        os.chdir(tmp)
+        try:
+            _bench_web(results, args, rng, requests, make_server)
+        finally:
+            os.chdir(cwd)
+
+def _bench_web(results, args, rng, requests, make_server):
+    import web
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, web.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    session = requests.Session()
+    try:
+        photos = []
+        for i in range(args.uploads):
+            ok, buf = cv2.imencode('.jpg', synthetic_photo(rng, (480, 640)))
+            photos.append((f'bench_{i:03d}.jpg', buf.tobytes()))
+        total = sum(len(b) for _, b in photos)
+        rounds = iter(range(1 << 30))
+
+        def upload():
+            # 每轮文件名和内容都不同，避免命中去重
+            k = next(rounds)
+            files = [('photos', (f'{k}_{name}', data + k.to_bytes(4, 'little'), 'image/jpeg'))
+                     for name, data in photos]
+            session.post(base + '/', files=files, allow_redirects=False).raise_for_status()
+        r = measure(upload, args.repeat)
+        r['mb_per_s'] = total / 2**20 / r['median']
+        results.append(dict(name='web.upload', params={'files': len(photos), 'bytes': total}, **r))
+
+        r = measure(lambda: session.get(base + '/api/list').raise_for_status(), args.repeat)
+        r['requests_per_s'] = 1 / r['median']
+        listing = session.get(base + '/api/list').json()
+        results.append(dict(name='web.list', params={'files': len(listing['files'])}, **r))
+
+        names = listing['files'][:len(photos)]
+
+        def download():
+            for name in names:
+                session.get(base + '/api/download/' + name).raise_for_status()
+        r = measure(download, args.repeat)
+        r['requests_per_s'] = len(names) / r['median']
+        results.append(dict(name='web.download', params={'files': len(names)}, **r))
+    finally:
+        server.shutdown()
+        thread.join()
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="重建流水线和上传服务器的性能基准")
+    parser.add_argument('-o', '--output', default='benchmark.json', help="JSON 结果文件")
+    parser.add_argument('--only', help="只运行这些组，逗号分隔：" + ','.join(GROUPS))
+    parser.add_argument('--sizes', default='64,96,128,256', help="雕刻/平滑/网格的体素分辨率")
+    parser.add_argument('--repeat', type=int, default=5, help="每项计时次数")
+    parser.add_argument('--photos', type=int, default=12, help="点云生成用的合成照片数")
+    parser.add_argument('--uploads', type=int, default=20, help="每轮上传的图片数")
+    args = parser.parse_args(argv)
+    args.sizes = [int(s) for s in args.sizes.split(',')]
+    groups = args.only.split(',') if args.only else list(GROUPS)
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"未知的基准组: {', '.join(sorted(unknown))}")
+
+    rng = np.random.default_rng(SEED)
+    results = []
+    for g in groups:
+        t0 = time.perf_counter()
+        start = len(results)
+        globals()['bench_' + g](results, args, rng)
+        for r in results[start:]:
+            print(f"{r['name']:<18} {json.dumps(r['params'], ensure_ascii=False):<28} "
+                  f"中位 {r['median'] * 1000:9.2f} ms  峰值 {r['peak_mb']:8.1f} MB")
+        print(f"-- {g} 用时 {time.perf_counter() - t0:.1f}s")
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': SEED,
+        'results': results,
+        'max_rss_mb': max_rss_mb(),
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存为 {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
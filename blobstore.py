@@ -0,0 +1,133 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+CHUNK_SIZE = 256 * 1024
+STALE_PART = 3600  # 超过这么久没写入的 .part 视为中断遗留，清空时一并删除
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class BlobStore:
+    """按内容寻址的上传存储
+
+    内容存为 <folder>/.blobs/<sha256>，对外的文件名是指向 blob 的硬链接，
+    所以 send_from_directory、目录索引等按文件名访问的代码都不用改。
+    相同内容只占一份磁盘空间；文件系统不支持硬链接时退回复制。
+    lock 使清空与 blob 的提交、链接互斥；调用方登记文件名时也持有它，
+    清空之后不会留下指向已删内容的索引条目。
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.blob_dir = os.path.join(folder, '.blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.lock = threading.RLock()
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest)
+
+    def writer(self):
+        """逐块写入的新 blob，用于边收边存的上传"""
+        return BlobWriter(self)
+
+    def put_stream(self, stream):
+        """边写临时文件边算 sha256，返回 (digest, 是否新内容)"""
+        w = self.writer()
+        try:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                w.write(chunk)
+        except BaseException:
+            w.abort()
+            raise
+        return w.commit()
+
+    def put_file(self, path, expected=None):
+        """把同一文件系统上已写好的文件改名移入存储，返回 (digest, 是否新内容)
+
+        expected 给出时内容哈希不符则删除文件并抛出 ValueError。
+        """
+        digest = sha256_file(path)
+        if expected and expected != digest:
+            os.remove(path)
+            raise ValueError(f'内容哈希 {digest} 与预期 {expected} 不符')
+        with self.lock:
+            if os.path.exists(self.blob_path(digest)):
+                os.remove(path)
+                return digest, False
+            os.replace(path, self.blob_path(digest))
+        return digest, True
+
+    def link(self, digest, name):
+        dst = os.path.join(self.folder, name)
+        # name 只能是存储目录下的一个文件名，不能带目录或跳出存储目录
+        if os.path.dirname(os.path.realpath(dst)) != os.path.realpath(self.folder):
+            raise ValueError(f'文件名不能包含路径: {name}')
+        try:
+            os.link(self.blob_path(digest), dst)
+        except OSError:
+            shutil.copyfile(self.blob_path(digest), dst)
+        return dst
+
+    def usage(self):
+        """(blob 数, 实际占用字节数)，不含正在写入的临时文件"""
+        count = size = 0
+        with os.scandir(self.blob_dir) as it:
+            for e in it:
+                if e.is_file() and not e.name.endswith('.part'):
+                    count += 1
+                    size += e.stat().st_size
+        return count, size
+
+    def clear(self):
+        """删除所有 blob；正在写入的 .part 留给各自的上传提交或放弃"""
+        cutoff = time.time() - STALE_PART
+        with self.lock:
+            for fname in os.listdir(self.blob_dir):
+                path = os.path.join(self.blob_dir, fname)
+                try:
+                    if not fname.endswith('.part') or os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+class BlobWriter:
+    """先写 .part 临时文件并同时算哈希，commit() 时按哈希改名，内容已存在则丢弃临时文件"""
+    def __init__(self, store):
+        self.store = store
+        self.size = 0
+        self._hash = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(suffix='.part', dir=store.blob_dir)
+        self._file = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self._hash.update(data)
+        self._file.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        """返回 (digest, 是否新内容)"""
+        try:
+            self._file.close()
+            digest = self._hash.hexdigest()
+            path = self.store.blob_path(digest)
+            with self.store.lock:
+                if os.path.exists(path):
+                    os.remove(self.tmp_path)
+                    return digest, False
+                os.replace(self.tmp_path, path)
+            return digest, True
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
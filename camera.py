@@ -0,0 +1,105 @@
+import threading
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+class CameraThread(threading.Thread):
+    """后台线程持续读摄像头，最近几帧放在预分配的环形缓冲区里
+
+    每帧读入时顺便缩小到预览尺寸（保持比例，不超过 preview_size）再转 RGB，
+    GUI 线程只需把预览缓冲区包成 QImage，不再在 GUI 线程里解码、转换整帧。
+    读者使用某个槽位期间写线程会跳过它，所以读到的数据不会被覆盖一半。
+    """
+    def __init__(self, index=0, slots=4, preview_size=(400, 300)):
+        super().__init__(daemon=True)
+        self.cap = cv2.VideoCapture(index)
+        self.preview_size = preview_size
+        self.frames = [None] * slots    # 原始 BGR 帧
+        self.previews = [None] * slots  # 缩小后的 RGB 预览
+        self.seqs = [0] * slots
+        self._pins = [0] * slots
+        self._small = None
+        self._newest = -1
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def _preview_shape(self, h, w):
+        pw, ph = self.preview_size
+        s = min(pw / w, ph / h)
+        return max(1, int(h * s)), max(1, int(w * s))
+
+    def _next_slot(self):
+        # 从最新槽位之后找一个没有被读者占用的槽位
+        with self._lock:
+            n = len(self.frames)
+            for k in range(1, n + 1):
+                i = (self._newest + k) % n
+                if i != self._newest and not self._pins[i]:
+                    return i
+        return None
+
+    def run(self):
+        while not self._stopping.is_set():
+            i = self._next_slot()
+            if i is None:
+                self._stopping.wait(0.005)
+                continue
+            ret, frame = self.cap.read(self.frames[i])
+            if not ret:
+                self._stopping.wait(0.03)
+                continue
+            self.frames[i] = frame
+            ph, pw = self._preview_shape(*frame.shape[:2])
+            small = self.previews[i]
+            if small is None or small.shape[:2] != (ph, pw):
+                small = np.empty((ph, pw, 3), dtype=np.uint8)
+                self.previews[i] = small
+            if self._small is None or self._small.shape != small.shape:
+                self._small = np.empty_like(small)
+            # 先缩小再转颜色，转换只处理 400x300 的像素
+            cv2.resize(frame, (pw, ph), dst=self._small, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self._small, cv2.COLOR_BGR2RGB, dst=small)
+            with self._lock:
+                self._seq += 1
+                self.seqs[i] = self._seq
+                self._newest = i
+
+    @contextmanager
+    def _pinned(self):
+        with self._lock:
+            i = self._newest
+            if i >= 0:
+                self._pins[i] += 1
+        try:
+            yield i
+        finally:
+            if i >= 0:
+                with self._lock:
+                    self._pins[i] -= 1
+
+    @contextmanager
+    def preview(self):
+        """with 块内返回 (最新预览 RGB 数组, 帧序号)，还没有帧时为 (None, 0)
+
+        数组直接引用环形缓冲区，只在 with 块内有效。
+        """
+        with self._pinned() as i:
+            if i < 0:
+                yield None, 0
+            else:
+                yield self.previews[i], self.seqs[i]
+
+    def latest(self):
+        """最新一帧原始图像的拷贝，不等待新帧；还没有帧时返回 None"""
+        with self._pinned() as i:
+            if i < 0:
+                return None
+            return self.frames[i].copy()
+
+    def stop(self, timeout=1.0):
+        self._stopping.set()
+        if self.is_alive():
+            self.join(timeout)
+        self.cap.release()
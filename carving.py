@@ -0,0 +1,270 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# 每个字节中 1 的个数，用于统计打包体素数量
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def _face_planes(masks):
+    """把六个面的 mask 合成两张平面图
+
+    与原来逐切片 &= 的写法等价：
+    前后、上下四个面约束 voxel[x, y, z] 的 (y, z)，左右两个面约束 (y, x)。
+    返回 yz[y, z] 和 yx[y, x]。
+    """
+    m = [np.asarray(mk).astype(bool) for mk in masks]
+    yz = m[0] & m[1][:, ::-1] & m[4] & m[5][::-1, :]
+    yx = m[2] & m[3][:, ::-1]
+    return yz, yx
+
+def carve(masks, packed=False):
+    """六视图可视外壳，一次广播得到整个体素网格
+
+    masks 为 front/back/left/right/top/bottom 六张 N*N 的 mask（0/1 或 bool）。
+    packed=False 返回 (N,N,N) bool；packed=True 返回沿 z 轴按位打包的
+    (N,N,ceil(N/8)) uint8，内存只有 1/8，可用 unpack/occupied 读取。
+    """
+    yz, yx = _face_planes(masks)
+    if packed:
+        yz_bits = np.packbits(yz, axis=1)
+        # voxel[x, y, :] = yz[y, :] if yx[y, x] else 0
+        return yz_bits[None, :, :] * yx.T[:, :, None].astype(np.uint8)
+    return yx.T[:, :, None] & yz[None, :, :]
+
+def unpack(voxel_bits, n):
+    """打包网格还原为 (N,N,N) bool"""
+    return np.unpackbits(voxel_bits, axis=-1, count=n).astype(bool)
+
+def count_occupied(voxel, packed=False):
+    if packed:
+        return int(_POPCOUNT[voxel].sum(dtype=np.int64))
+    return int(np.count_nonzero(voxel))
+
+def occupied(voxel, n=None, packed=False, slab=16):
+    """占据体素的坐标，结果与 np.argwhere(dense) 完全相同
+
+    打包网格每次只解包 slab 个 x 切片，不还原整个稠密网格。
+    """
+    if not packed:
+        return np.argwhere(voxel)
+    parts = []
+    for x0 in range(0, voxel.shape[0], slab):
+        idx = np.argwhere(unpack(voxel[x0:x0 + slab], n))
+        idx[:, 0] += x0
+        parts.append(idx)
+    if not parts:
+        return np.empty((0, 3), dtype=np.intp)
+    return np.concatenate(parts)
+
+EMPTY, FULL, PARTIAL = 0, 1, 2
+
+class SparseHull:
+    """分层稀疏体素网格
+
+    state 为叶块分辨率 (N/leaf)^3 的粗网格，每块 EMPTY/FULL/PARTIAL；
+    只有 PARTIAL（跨越表面）的叶块保存体素，按 z 轴打包成 (leaf, leaf, leaf/8) uint8。
+    内存和计算量随表面积而不是 N^3 增长。
+    """
+    def __init__(self, n, leaf, state, leaf_coords, leaf_bits):
+        self.n = n
+        self.leaf = leaf
+        self.state = state
+        self.leaf_coords = leaf_coords
+        self.leaf_bits = leaf_bits
+        self.leaf_id = np.full(state.shape, -1, dtype=np.int32)
+        if len(leaf_coords):
+            self.leaf_id[tuple(leaf_coords.T)] = np.arange(len(leaf_coords), dtype=np.int32)
+
+    def count(self):
+        full = int(np.count_nonzero(self.state == FULL)) * self.leaf ** 3
+        return full + int(_POPCOUNT[self.leaf_bits].sum(dtype=np.int64))
+
+    def region(self, lo, hi):
+        """取出 [lo, hi) 范围的稠密 bool 子网格，超出 N 的部分为 False"""
+        lo = np.asarray(lo)
+        hi = np.asarray(hi)
+        b = self.leaf
+        c0 = lo // b
+        c1 = np.minimum(-(-hi // b), self.state.shape)
+        out = np.zeros(tuple((c1 - c0) * b), dtype=bool)
+        sub = self.state[c0[0]:c1[0], c0[1]:c1[1], c0[2]:c1[2]]
+        full = sub == FULL
+        if full.any():
+            out[:] = full.repeat(b, 0).repeat(b, 1).repeat(b, 2)
+        for c in np.argwhere(sub == PARTIAL):
+            block = np.unpackbits(self.leaf_bits[self.leaf_id[tuple(c + c0)]], axis=-1, count=b)
+            s = c * b
+            out[s[0]:s[0] + b, s[1]:s[1] + b, s[2]:s[2] + b] = block
+        off = lo - c0 * b
+        size = np.minimum(hi, self.n) - lo
+        out = out[off[0]:off[0] + size[0], off[1]:off[1] + size[1], off[2]:off[2] + size[2]]
+        pad = [(0, int(h - lo_ - s)) for h, lo_, s in zip(hi, lo, size)]
+        if any(p[1] for p in pad):
+            out = np.pad(out, pad)
+        return out
+
+    def to_dense(self):
+        return self.region((0, 0, 0), (self.n,) * 3)
+
+    def points(self):
+        """所有占据体素坐标，顺序与 np.argwhere(稠密网格) 相同
+
+        按叶块厚度的 x 板逐块展开，峰值内存为 leaf*N*N 而不是 N^3。
+        """
+        parts = []
+        for x0 in range(0, self.n, self.leaf):
+            x1 = min(x0 + self.leaf, self.n)
+            idx = np.argwhere(self.region((x0, 0, 0), (x1, self.n, self.n)))
+            idx[:, 0] += x0
+            parts.append(idx)
+        return np.concatenate(parts) if parts else np.empty((0, 3), dtype=np.intp)
+
+    def surface_cells(self):
+        """需要做 marching cubes 的叶块坐标
+
+        一个叶块负责从它的起点开始的 leaf^3 个立方体，采样点要多取 +1 层，
+        所以除 PARTIAL 块外，与 +x/+y/+z 方向相邻块状态不同的均匀块也要处理。
+        """
+        st = self.state
+        need = st == PARTIAL
+        shape = st.shape
+        for dx in (0, 1):
+            for dy in (0, 1):
+                for dz in (0, 1):
+                    if dx == dy == dz == 0:
+                        continue
+                    a = st[:shape[0] - dx, :shape[1] - dy, :shape[2] - dz]
+                    b = st[dx:, dy:, dz:]
+                    need[:shape[0] - dx, :shape[1] - dy, :shape[2] - dz] |= a != b
+        return np.argwhere(need)
+
+def _classify(yx_cum, yz_cum, origins, size):
+    # 用前缀和统计每个块在每一行 y 上 x 方向/z 方向的占据数，向量化判断整块空/满/部分
+    n = yx_cum.shape[0]
+    ar = np.arange(size)
+    x0, y0, z0 = origins[:, 0], origins[:, 1], origins[:, 2]
+    x1 = np.minimum(x0 + size, n)
+    z1 = np.minimum(z0 + size, n)
+    rows = y0[:, None] + ar[None, :]
+    valid = rows < n
+    rows = np.minimum(rows, n - 1)
+    cx = yx_cum[rows, x1[:, None]] - yx_cum[rows, x0[:, None]]
+    cz = yz_cum[rows, z1[:, None]] - yz_cum[rows, z0[:, None]]
+    any_ = ((cx > 0) & (cz > 0) & valid).any(axis=1)
+    all_ = (((cx == (x1 - x0)[:, None]) & (cz == (z1 - z0)[:, None])) | ~valid).all(axis=1)
+    cls = np.full(len(origins), PARTIAL, dtype=np.uint8)
+    cls[all_] = FULL
+    cls[~any_] = EMPTY
+    return cls
+
+def carve_sparse(masks, leaf=8, batch=4096):
+    """由粗到细的六视图雕刻，返回 SparseHull，结果与 carve(masks) 相同
+
+    从较大的块开始判断整块空/满/部分，只细分部分块，直到叶块大小 leaf（8 的倍数）。
+    """
+    if leaf % 8:
+        raise ValueError("leaf 必须是 8 的倍数")
+    yz, yx = _face_planes(masks)
+    n = yz.shape[0]
+    cells = -(-n // leaf)
+    npad = cells * leaf
+    # 补齐到叶块整数倍，补出的部分为空
+    yz = np.pad(yz, ((0, npad - n), (0, npad - n)))
+    yx = np.pad(yx, ((0, npad - n), (0, npad - n)))
+    yx_cum = np.zeros((npad, npad + 1), dtype=np.int32)
+    yz_cum = np.zeros((npad, npad + 1), dtype=np.int32)
+    np.cumsum(yx, axis=1, out=yx_cum[:, 1:])
+    np.cumsum(yz, axis=1, out=yz_cum[:, 1:])
+
+    state = np.zeros((cells,) * 3, dtype=np.uint8)
+    size = leaf
+    while size * 2 <= npad // 4:
+        size *= 2
+    grid = np.arange(0, npad, size)
+    origins = np.stack(np.meshgrid(grid, grid, grid, indexing='ij'), -1).reshape(-1, 3)
+    while True:
+        cls = _classify(yx_cum, yz_cum, origins, size)
+        span = size // leaf
+        for o in origins[cls == FULL] // leaf:
+            state[o[0]:o[0] + span, o[1]:o[1] + span, o[2]:o[2] + span] = FULL
+        origins = origins[cls == PARTIAL]
+        if size == leaf:
+            break
+        size //= 2
+        kids = np.array([(dx, dy, dz) for dx in (0, size) for dy in (0, size) for dz in (0, size)])
+        origins = (origins[:, None, :] + kids[None, :, :]).reshape(-1, 3)
+        origins = origins[(origins < npad).all(axis=1)]
+
+    leaf_coords = origins // leaf
+    state[tuple(leaf_coords.T)] = PARTIAL
+    # 部分块的体素直接由两张平面图算出：voxel[x,y,z] = yx[y,x] & yz[y,z]
+    leaf_bits = np.empty((len(origins), leaf, leaf, leaf // 8), dtype=np.uint8)
+    ar = np.arange(leaf)
+    for s in range(0, len(origins), batch):
+        o = origins[s:s + batch]
+        xs = o[:, 0, None] + ar
+        ys = o[:, 1, None] + ar
+        zs = o[:, 2, None] + ar
+        a = yx[ys[:, :, None], xs[:, None, :]]          # (M, y, x)
+        b = yz[ys[:, :, None], zs[:, None, :]]          # (M, y, z)
+        block = a.transpose(0, 2, 1)[:, :, :, None] & b[:, None, :, :]
+        leaf_bits[s:s + batch] = np.packbits(block, axis=-1)
+    return SparseHull(n, leaf, state, leaf_coords.astype(np.intp), leaf_bits)
+
+def projection(K, R, t):
+    """相机内参 K(3x3)、外参 R(3x3)/t(3) 合成 3x4 投影矩阵，像素 = K (R X + t)"""
+    K = np.asarray(K, dtype=np.float64)
+    Rt = np.hstack([np.asarray(R, dtype=np.float64), np.asarray(t, dtype=np.float64).reshape(3, 1)])
+    return K @ Rt
+
+def carve_views(masks, cameras, n, bounds, packed=False, slab_voxels=1 << 18, workers=None):
+    """标定多视图可视外壳，视图数量和拍摄角度任意
+
+    masks 为各视图的 mask（0/1 或 bool，尺寸可以不同），cameras 为对应的 (K, R, t)。
+    bounds 为体素网格覆盖的世界坐标范围 ((x0,y0,z0), (x1,y1,z1))，网格为 n^3，
+    体素中心投影到每个视图，落在任一视图轮廓外（或图像外、相机背后）的体素被雕去。
+    网格按 x 切成若干板，各板在线程池中并行计算；板内存活体素一次性向量化投影
+    并批量查 mask，每个视图之后只保留仍存活的体素，后面的视图越算越少。
+    返回与 carve 相同排布的 (n,n,n) bool，packed=True 时沿 z 轴按位打包。
+    """
+    if len(masks) != len(cameras):
+        raise ValueError("masks 与 cameras 数量不一致")
+    lo = np.asarray(bounds[0], dtype=np.float64)
+    hi = np.asarray(bounds[1], dtype=np.float64)
+    cx, cy, cz = [lo[k] + (np.arange(n) + 0.5) * (hi[k] - lo[k]) / n for k in range(3)]
+    masks = [np.asarray(m).astype(bool) for m in masks]
+    P = [projection(*cam) for cam in cameras]
+    # P @ [x,y,z,1] 按坐标轴拆开：y/z/常数项对每个视图预先算好，所有板共用
+    yz_part = [(p[:, 1, None, None] * cy[None, :, None] + p[:, 2, None, None] * cz[None, None, :]
+                + p[:, 3, None, None]).reshape(3, n * n) for p in P]
+    x_part = [np.outer(p[:, 0], cx) for p in P]  # (3, n)
+    rows = max(1, slab_voxels // (n * n))
+
+    def carve_slab(x0):
+        x1 = min(x0 + rows, n)
+        alive = np.arange((x1 - x0) * n * n)
+        xi = x0 + alive // (n * n)
+        yz = alive % (n * n)
+        for m, yzp, xp in zip(masks, yz_part, x_part):
+            if len(alive) == 0:
+                break
+            w = yzp[2, yz] + xp[2, xi]
+            front = w > 1e-9
+            w[~front] = 1.0
+            u = np.floor((yzp[0, yz] + xp[0, xi]) / w).astype(np.int64)
+            r = np.floor((yzp[1, yz] + xp[1, xi]) / w).astype(np.int64)
+            inside = front & (u >= 0) & (r >= 0) & (r < m.shape[0]) & (u < m.shape[1])
+            hit = inside & m[np.where(inside, r, 0), np.where(inside, u, 0)]
+            alive, xi, yz = alive[hit], xi[hit], yz[hit]
+        slab = np.zeros((x1 - x0) * n * n, dtype=bool)
+        slab[alive] = True
+        slab = slab.reshape(x1 - x0, n, n)
+        return np.packbits(slab, axis=-1) if packed else slab
+
+    starts = range(0, n, rows)
+    if workers == 1 or len(starts) == 1:
+        slabs = [carve_slab(x0) for x0 in starts]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            slabs = list(pool.map(carve_slab, starts))
+    return np.concatenate(slabs)
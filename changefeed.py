@@ -0,0 +1,73 @@
+import itertools
+import threading
+import time
+import uuid
+from collections import deque
+
+class ChangeFeed:
+    """上传目录的变更事件流，供长轮询和 SSE 接口使用
+
+    事件为 {seq, type, time, ...}，序号从 1 递增，内存中最多保留 maxlen 条。
+    id 每次启动随机生成；客户端带来的 id 不同、序号超出当前范围或已被丢弃时，
+    since() 返回需要重新同步，客户端应重新拉一遍文件列表。
+    """
+    def __init__(self, maxlen=10000):
+        self.id = uuid.uuid4().hex
+        self._events = deque(maxlen=maxlen)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def publish(self, kind, **data):
+        with self._cond:
+            self._seq += 1
+            self._events.append(dict(data, seq=self._seq, type=kind, time=time.time()))
+            self._cond.notify_all()
+            return self._seq
+
+    def since(self, seq, feed_id=None, timeout=0.0):
+        """返回 (序号大于 seq 的事件列表, 是否需要重新同步)
+
+        没有新事件时最多等待 timeout 秒，超时返回空列表。
+        """
+        if (feed_id and feed_id != self.id) or seq > self._seq:
+            return [], True
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._seq <= seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], False
+                self._cond.wait(remaining)
+            oldest = self._events[0]['seq']
+            if seq < oldest - 1:
+                return [], True
+            # 队列中序号连续，按偏移直接取
+            return list(itertools.islice(self._events, seq - oldest + 1, None)), False
+
+class FeedClient:
+    """/api/changes 长轮询客户端，记住 feed id 和已处理到的序号"""
+    def __init__(self, session, server, timeout=10):
+        self.session = session
+        self.url = server + '/api/changes'
+        self.timeout = timeout
+        self.feed = None
+        self.seq = 0
+
+    def poll(self, timeout=None):
+        """等待下一批事件，返回 (事件列表, 是否需要重新同步)；第一次调用只取当前位置"""
+        wait = self.timeout if timeout is None else timeout
+        params = {'since': self.seq, 'timeout': wait}
+        if self.feed:
+            params['feed'] = self.feed
+        resp = self.session.get(self.url, params=params, timeout=wait + 30)
+        resp.raise_for_status()
+        data = resp.json()
+        first = self.feed is None
+        self.feed, self.seq = data['feed'], data['seq']
+        if first:
+            return [], False
+        return data['events'], data['reset']
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as Urllib3Error
+from urllib3.util.retry import Retry
+
+from variants import variant_tag
+
+CHUNK_SIZE = 256 * 1024
+
+def make_session(pool_size=4, retries=3, backoff=0.5):
+    """带连接池和自动重试的 Session，所有下载线程共用"""
+    retry = Retry(total=retries, connect=retries, read=retries,
+                  backoff_factor=backoff,
+                  status_forcelist=(500, 502, 503, 504),
+                  allowed_methods=('GET', 'HEAD'))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def fetch_file(session, url, cache, name, digest=None, timeout=30, max_side=None, scale=None):
+    """取得一张图片的本地缓存路径，只在缓存没有时才真正下载
+
+    列表已给出哈希且缓存命中时不发请求；否则带 If-None-Match 请求，
+    304 直接复用缓存。边下载边计算哈希写入临时文件，完成后再移入缓存，
+    中途失败不会留下半个文件。
+    max_side/scale 请求服务端的缩小版本，缓存键为 <哈希>-<缩小参数>，与服务端 ETag 一致。
+    """
+    ext = os.path.splitext(name)[1]
+    tag = variant_tag(max_side, scale)
+    if digest:
+        key = f'{digest}-{tag}' if tag else digest
+        cached = cache.get(key, ext)
+        if cached:
+            cache.remember(name, key, tag)
+            return cached
+    headers = {}
+    old = cache.etag_for(name, tag)
+    if old:
+        headers['If-None-Match'] = f'"{old}"'
+    params = {}
+    if max_side:
+        params['max_side'] = max_side
+    elif scale:
+        params['scale'] = scale
+    with session.get(url, params=params, stream=True, timeout=timeout, headers=headers) as resp:
+        if resp.status_code == 304 and old:
+            return cache.get(old, ext)
+        resp.raise_for_status()
+        h = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(suffix='.part', dir=cache.root)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in resp.iter_content(CHUNK_SIZE):
+                    h.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    key = h.hexdigest()
+    if tag:
+        key = resp.headers.get('ETag', '').strip('"') or f'{key}-{tag}'
+    return cache.commit(tmp_path, key, name, tag)
+
+def download_files(session, base_url, entries, cache, workers=4, max_side=None, scale=None):
+    """并发获取 entries 中的图片，每完成一张 yield (在 entries 中的下标, 本地路径)
+
+    entries 为 /api/list 的 items（含 name、hash），也可以是纯文件名。
+    按完成先后产出，调用方边迭代边解码，处理与尚未完成的传输重叠进行；
+    需要列表顺序时由调用方按下标排回（batch_points 的 indexed，或 in_order）。
+    下载失败的文件打印后跳过；全部结束后保存文件名清单并按容量淘汰旧缓存。
+    max_side/scale 不为空时向服务端请求缩小版本。
+    """
+    entries = [e if isinstance(e, dict) else {'name': e} for e in entries]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(fetch_file, session, base_url + quote(e['name']),
+                        cache, e['name'], e.get('hash'),
+                        max_side=max_side, scale=scale): i
+            for i, e in enumerate(entries)
+        }
+        for fut in as_completed(futures):
+            i = futures[fut]
+            try:
+                yield i, fut.result()
+            except Exception as e:
+                print(f"下载失败 {entries[i]['name']}：{e}")
+                yield i, None
+    cache.save_manifest()
+    tag = variant_tag(max_side, scale)
+    cache.evict(keep={cache.etag_for(e['name'], tag) for e in entries} - {None})
+
+class ResumableReader:
+    """把 /api/archive 的响应包装成可 read() 的流，连接中断时从断点续传
+
+    续传请求带 Range 和 If-Range(首个响应的 ETag)；服务端文件集合已变化时
+    会返回 200 整包，此时无法接续，直接报错。
+    """
+    def __init__(self, session, url, files, retries=3, timeout=30):
+        self.session = session
+        self.url = url
+        self.files = files
+        self.retries = retries
+        self.timeout = timeout
+        self.pos = 0
+        self.length = None
+        self.etag = None
+        self._resp = None
+        self._open()
+
+    def _open(self):
+        headers = {}
+        if self.pos:
+            headers = {'Range': f'bytes={self.pos}-', 'If-Range': self.etag}
+        if self._resp is not None:
+            self._resp.close()
+        resp = self.session.post(self.url, json={'files': self.files}, headers=headers,
+                                 stream=True, timeout=self.timeout)
+        resp.raise_for_status()
+        if self.pos and resp.status_code != 206:
+            resp.close()
+            raise IOError("服务端归档内容已变化，无法续传")
+        if not self.pos:
+            self.etag = resp.headers.get('ETag')
+            self.length = int(resp.headers['Content-Length'])
+        self._resp = resp
+
+    def read(self, n=-1):
+        attempts = 0
+        while True:
+            try:
+                data = self._resp.raw.read(None if n < 0 else n)
+                if data or self.pos >= self.length:
+                    self.pos += len(data)
+                    return data
+                # 没读到数据但还没到总长度：连接被提前关闭
+                raise IOError("连接提前结束")
+            except (Urllib3Error, OSError):
+                attempts += 1
+                if attempts > self.retries:
+                    raise
+                self._open()
+
+    def close(self):
+        if self._resp is not None:
+            self._resp.close()
+
+def in_order(pairs):
+    """把按完成先后到达的 (下标, 值) 按下标从 0 起依次排回，先到的只缓存值本身（路径）
+
+    缺失的下标等到最后，其余的按顺序补出。
+    """
+    pending = {}
+    nxt = 0
+    for i, value in pairs:
+        pending[i] = value
+        while nxt in pending:
+            yield nxt, pending.pop(nxt)
+            nxt += 1
+    for i in sorted(pending):
+        yield i, pending[i]
+
+def download_archive(session, archive_url, entries, cache, retries=3):
+    """用一个 tar 流获取所有未缓存的图片，边解包边 yield (在 entries 中的下标, 本地路径)
+
+    列表已给出哈希且本地缓存命中的图片直接 yield，不放进归档请求。
+    """
+    entries = [e if isinstance(e, dict) else {'name': e} for e in entries]
+    missing = []
+    index = {}
+    for i, e in enumerate(entries):
+        ext = os.path.splitext(e['name'])[1]
+        cached = cache.get(e['hash'], ext) if e.get('hash') else None
+        if cached:
+            cache.remember(e['name'], e['hash'])
+            yield i, cached
+        else:
+            missing.append(e['name'])
+            index[e['name']] = i
+    if missing:
+        reader = ResumableReader(session, archive_url, missing, retries=retries)
+        try:
+            with tarfile.open(fileobj=reader, mode='r|') as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    src = tar.extractfile(member)
+                    h = hashlib.sha256()
+                    fd, tmp_path = tempfile.mkstemp(suffix='.part', dir=cache.root)
+                    try:
+                        with os.fdopen(fd, 'wb') as f:
+                            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                                h.update(chunk)
+                                f.write(chunk)
+                    except BaseException:
+                        # 连接中断、长度不符、磁盘写满时不留下半个文件
+                        os.remove(tmp_path)
+                        raise
+                    yield index.get(member.name, len(entries)), cache.commit(tmp_path, h.hexdigest(), member.name)
+        finally:
+            reader.close()
+    cache.save_manifest()
+    cache.evict(keep={cache.etag_for(e['name']) for e in entries} - {None})
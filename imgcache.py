@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+
+class ImageCache:
+    """按内容哈希存放图片的本地缓存
+
+    文件存为 <root>/<sha256><ext>，另有 names.json 记录 文件名->哈希，
+    用于向服务器发 If-None-Match。总大小超过 max_bytes 时按最近使用时间淘汰。
+    """
+    def __init__(self, root, max_bytes=1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._manifest_path = os.path.join(root, 'names.json')
+        os.makedirs(root, exist_ok=True)
+        try:
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                self.names = json.load(f)
+        except (OSError, ValueError):
+            self.names = {}
+
+    def path(self, digest, ext=''):
+        return os.path.join(self.root, digest + ext.lower())
+
+    def get(self, digest, ext=''):
+        # 命中时刷新 mtime，淘汰按 mtime 近似 LRU
+        p = self.path(digest, ext)
+        if not os.path.exists(p):
+            return None
+        os.utime(p)
+        return p
+
+    @staticmethod
+    def _name_key(name, tag=''):
+        # 同一文件不同缩小版本分开记录
+        return f'{name}#{tag}' if tag else name
+
+    def etag_for(self, name, tag=''):
+        digest = self.names.get(self._name_key(name, tag))
+        if digest and os.path.exists(self.path(digest, os.path.splitext(name)[1])):
+            return digest
+        return None
+
+    def commit(self, tmp_path, digest, name, tag=''):
+        p = self.path(digest, os.path.splitext(name)[1])
+        os.replace(tmp_path, p)
+        self.remember(name, digest, tag)
+        return p
+
+    def remember(self, name, digest, tag=''):
+        with self._lock:
+            self.names[self._name_key(name, tag)] = digest
+
+    def save_manifest(self):
+        with self._lock:
+            tmp = self._manifest_path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.names, f)
+            os.replace(tmp, self._manifest_path)
+
+    def evict(self, keep=()):
+        """淘汰最久未用的文件直到总大小不超过 max_bytes，keep 中的哈希不淘汰"""
+        entries = []
+        total = 0
+        for fname in os.listdir(self.root):
+            p = os.path.join(self.root, fname)
+            if fname == 'names.json' or fname.endswith('.part') or not os.path.isfile(p):
+                continue
+            st = os.stat(p)
+            total += st.st_size
+            entries.append((st.st_mtime, st.st_size, p, os.path.splitext(fname)[0]))
+        entries.sort()
+        removed = set()
+        for _, size, p, digest in entries:
+            if total <= self.max_bytes:
+                break
+            if digest in keep:
+                continue
+            os.remove(p)
+            total -= size
+            removed.add(digest)
+        if removed:
+            with self._lock:
+                self.names = {n: d for n, d in self.names.items() if d not in removed}
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from pointcloud import gray_and_mask, stream_points
+from pointcloud_io import write_points, FORMATS
+
+def job_key(hashes, step, z_scale):
+    """由图片内容哈希序列和参数得到结果缓存的键"""
+    h = hashlib.sha256()
+    h.update(json.dumps({'images': list(hashes), 'step': step, 'z_scale': z_scale}).encode('utf-8'))
+    return h.hexdigest()
+
+def reconstruct_job(paths, out_path, step, z_scale):
+    """在子进程中运行：与 app.py 相同的抠图和采样，生成归一化点云写到 out_path(.npy)"""
+    def frames():
+        for p in paths:
+            frame = gray_and_mask(cv2.imread(p, cv2.IMREAD_UNCHANGED))
+            if frame is not None:
+                yield frame
+    points = stream_points(frames(), out_path, step=step, z_scale=z_scale)
+    if points is None:
+        # 没有有效点也写一个空结果，同样参数不必再算
+        np.save(out_path, np.empty((0, 3), dtype=np.float32))
+        return 0
+    return len(points)
+
+class JobQueue:
+    """后台进程池重建任务，结果按 job_key 缓存在 result_dir 下
+
+    任务 id 就是缓存键，同一组图片和参数重复提交直接返回已有结果或进行中的任务。
+    """
+    def __init__(self, result_dir, workers=None):
+        self.result_dir = result_dir
+        self.workers = workers
+        os.makedirs(result_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._jobs = {}
+
+    def _result_path(self, key, fmt='npy'):
+        return os.path.join(self.result_dir, f'{key}.{fmt}')
+
+    def submit(self, paths, hashes, step, z_scale):
+        key = job_key(hashes, step, z_scale)
+        fut = None
+        with self._lock:
+            job = self._jobs.get(key)
+            # 已完成的任务再次提交，结果直接取自缓存
+            reused = job is not None and job['status'] == 'done'
+            if job is None or job['status'] == 'failed':
+                if os.path.exists(self._result_path(key)):
+                    job = {'status': 'done', 'cached': True}
+                else:
+                    if self._pool is None:
+                        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                    job = {'status': 'running', 'cached': False}
+                    # 先写临时文件，完成后再改名，进行中的结果不会被当作缓存
+                    tmp_path = self._result_path(key, 'tmp.npy')
+                    fut = self._pool.submit(reconstruct_job, list(paths), tmp_path, step, z_scale)
+                self._jobs[key] = job
+        if fut is not None:
+            # 回调可能在当前线程立即执行，要在锁外注册
+            fut.add_done_callback(lambda f, k=key, t=tmp_path: self._finish(k, t, f))
+        status = self.status(key)
+        if reused:
+            status['cached'] = True
+        return key, status
+
+    def _finish(self, key, tmp_path, fut):
+        with self._lock:
+            job = self._jobs[key]
+            try:
+                job['points'] = fut.result()
+                os.replace(tmp_path, self._result_path(key))
+                job['status'] = 'done'
+            except Exception as e:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+
+    def status(self, key):
+        if not re.fullmatch(r'[0-9a-f]{64}', key):
+            return None
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                if not os.path.exists(self._result_path(key)):
+                    return None
+                job = self._jobs[key] = {'status': 'done', 'cached': True}
+            return dict(job)
+
+    def result_file(self, key, fmt='npy'):
+        """返回指定格式的结果文件路径，首次请求非 npy 格式时转换一次并缓存"""
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的点云格式: {fmt}")
+        npy_path = self._result_path(key)
+        if not os.path.exists(npy_path):
+            return None
+        path = self._result_path(key, fmt)
+        if not os.path.exists(path):
+            # 每次转换用各自的临时文件，同一任务的并发请求不会互相覆盖
+            fd, tmp_path = tempfile.mkstemp(suffix='.' + fmt, dir=self.result_dir)
+            os.close(fd)
+            try:
+                write_points(tmp_path, np.load(npy_path, mmap_mode='r'), fmt=fmt)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        return path
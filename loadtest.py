@@ -0,0 +1,177 @@
+"""上传服务器压力测试：并发上传、下载、列表，对比开发服务器和 serve.py 的吞吐
+
+    python loadtest.py --servers dev,gunicorn --clients 16 -o loadtest.json
+
+每种服务器在单独的临时目录里以子进程启动，互不影响，也不动真实的上传目录。
+dev 为原来的 app.run(debug=True)（不开自动重载），其余为 serve.py 的各个后端。
+图片是固定种子生成的合成 JPEG，每个客户端每轮的内容都不同，不会被去重。
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+import requests
+
+from benchmark import SEED, synthetic_photo
+from serve import SERVERS, available
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEV_CMD = "import web; web.app.run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)"
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(kind, port, threads, cwd):
+    if kind == 'dev':
+        cmd = [sys.executable, '-c', DEV_CMD.format(port=port)]
+    else:
+        cmd = [sys.executable, os.path.join(HERE, 'serve.py'), '--server', kind,
+               '--host', '127.0.0.1', '--port', str(port), '--threads', str(threads)]
+    env = dict(os.environ, PYTHONPATH=HERE + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'{kind} 服务器启动失败')
+        try:
+            requests.get(base + '/api/list', timeout=1)
+            return proc, base
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f'{kind} 服务器 30 秒内没有就绪')
+
+def run_clients(clients, work):
+    """clients 个线程各自用独立的 Session 执行 work(session, k)，返回 (墙钟秒, 各请求延迟, 字节数)"""
+    latencies, sizes = [], []
+    lock = threading.Lock()
+    errors = []
+
+    def client(k):
+        session = requests.Session()
+        lat, nbytes = [], 0
+        try:
+            for t, n in work(session, k):
+                lat.append(t)
+                nbytes += n
+        except Exception as e:
+            errors.append(e)
+        with lock:
+            latencies.extend(lat)
+            sizes.append(nbytes)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    if errors:
+        raise errors[0]
+    return wall, latencies, sum(sizes)
+
+def summarize(name, wall, latencies, nbytes):
+    lat = np.asarray(latencies) * 1000
+    return {'name': name, 'requests': len(lat), 'seconds': wall,
+            'requests_per_s': len(lat) / wall, 'mb_per_s': nbytes / 2**20 / wall,
+            'p50_ms': float(np.percentile(lat, 50)), 'p95_ms': float(np.percentile(lat, 95)),
+            'max_ms': float(lat.max())}
+
+def load_test(base, photos, args):
+    results = []
+
+    def upload(session, k):
+        for r in range(args.rounds):
+            # 每个客户端、每轮的内容都不同，避免命中去重
+            tag = (k * args.rounds + r).to_bytes(4, 'little')
+            files = [('photos', (f'c{k}_r{r}_{name}', data + tag, 'image/jpeg')) for name, data in photos]
+            t0 = time.perf_counter()
+            session.post(base + '/', files=files, allow_redirects=False).raise_for_status()
+            yield time.perf_counter() - t0, sum(len(d) + 4 for _, d in photos)
+    results.append(summarize('upload', *run_clients(args.clients, upload)))
+
+    names = requests.get(base + '/api/list').json()['files']
+
+    def download(session, k):
+        for i in range(args.downloads):
+            name = names[(k * args.downloads + i) % len(names)]
+            t0 = time.perf_counter()
+            resp = session.get(base + '/api/download/' + name)
+            resp.raise_for_status()
+            yield time.perf_counter() - t0, len(resp.content)
+    results.append(summarize('download', *run_clients(args.clients, download)))
+
+    def listing(session, k):
+        for _ in range(args.lists):
+            t0 = time.perf_counter()
+            resp = session.get(base + '/api/list')
+            resp.raise_for_status()
+            yield time.perf_counter() - t0, len(resp.content)
+    results.append(summarize('list', *run_clients(args.clients, listing)))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="上传服务器并发压力测试")
+    parser.add_argument('-o', '--output', default='loadtest.json', help="JSON 结果文件")
+    parser.add_argument('--servers', default='dev,' + ','.join(SERVERS),
+                        help="逗号分隔：dev（开发服务器）、" + '、'.join(SERVERS) + "，没安装的跳过")
+    parser.add_argument('--clients', type=int, default=16, help="并发客户端数")
+    parser.add_argument('--threads', type=int, default=16, help="serve.py 的工作线程数")
+    parser.add_argument('--rounds', type=int, default=10, help="每个客户端的上传请求数")
+    parser.add_argument('--files', type=int, default=4, help="每个上传请求的图片数")
+    parser.add_argument('--downloads', type=int, default=50, help="每个客户端的下载请求数")
+    parser.add_argument('--lists', type=int, default=20, help="每个客户端的列表请求数")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(SEED)
+    photos = []
+    for i in range(args.files):
+        ok, buf = cv2.imencode('.jpg', synthetic_photo(rng))
+        photos.append((f'load_{i}.jpg', buf.tobytes()))
+
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'cpu_count': os.cpu_count(),
+              'clients': args.clients, 'threads': args.threads,
+              'photo_bytes': sum(len(d) for _, d in photos) // len(photos), 'servers': {}}
+    for kind in args.servers.split(','):
+        if kind != 'dev' and not available(kind):
+            print(f"-- {kind} 未安装，跳过")
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            proc, base = start_server(kind, free_port(), args.threads, tmp)
+            try:
+                results = load_test(base, photos, args)
+            finally:
+                proc.terminate()
+                proc.wait(10)
+        report['servers'][kind] = results
+        for r in results:
+            print(f"{kind:<9} {r['name']:<9} {r['requests_per_s']:8.1f} 请求/秒 {r['mb_per_s']:8.1f} MB/s  "
+                  f"p50 {r['p50_ms']:7.1f} ms  p95 {r['p95_ms']:7.1f} ms")
+
+    base = report['servers'].get('dev')
+    if base:
+        for kind, results in report['servers'].items():
+            if kind == 'dev':
+                continue
+            gain = {r['name']: r['requests_per_s'] / b['requests_per_s'] for r, b in zip(results, base)}
+            report.setdefault('speedup_vs_dev', {})[kind] = gain
+            print(f"{kind} 相对 dev：" + '，'.join(f"{k} {v:.2f}x" for k, v in gain.items()))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存为 {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
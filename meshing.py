@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from skimage.measure import marching_cubes
+
+# 分块合计体素数少于此值时单进程做，spawn 启动进程池要一秒多，小网格不划算
+POOL_MIN_VOXELS = 32 * 1024 ** 2
+
+def weld(verts, faces):
+    """合并坐标完全相同的顶点（分块边界上重复生成的顶点），返回新的 verts/faces"""
+    if len(verts) == 0:
+        return verts, faces
+    # 二值网格 level=0.5 的顶点都是 0.5 的整数倍，编码成一维整数后去重快得多，
+    # 排序与按行字典序相同，结果不变
+    half = verts * 2
+    k = half.astype(np.int64)
+    if np.array_equal(k, half):
+        k -= k.min(axis=0)
+        span = k.max(axis=0) + 1
+        if np.prod(span.astype(np.float64)) < 2 ** 62:
+            key = (k[:, 0] * span[1] + k[:, 1]) * span[2] + k[:, 2]
+            _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+            return verts[first], inverse.reshape(-1)[faces]
+    uniq, inverse = np.unique(verts, axis=0, return_inverse=True)
+    return uniq, inverse.reshape(-1)[faces]
+
+def _mesh_blocks(tasks):
+    # 在子进程中执行：tasks 为 [(block, lo)]，顶点坐标平移回整个网格
+    out = []
+    for block, lo in tasks:
+        v, f, _, _ = marching_cubes(block, level=0.5)
+        out.append((v + lo, f))
+    return out
+
+def _mesh_chunks(tasks, workers=None):
+    """对各分块做 marching cubes，多核且分块够多时分批交给进程池，最后拼接并焊接接缝"""
+    if not tasks:
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.int64)
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    if workers <= 1 or sum(block.size for block, _ in tasks) < POOL_MIN_VOXELS:
+        results = _mesh_blocks(tasks)
+    else:
+        # 每个进程分到几批，减少进程间传输次数又能平衡负载
+        per = -(-len(tasks) // (workers * 4))
+        batches = [tasks[i:i + per] for i in range(0, len(tasks), per)]
+        # spawn 启动：调用方可能是 Qt 界面或带线程的进程，fork 出来的子进程会继承锁的状态
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = [r for part in pool.map(_mesh_blocks, batches) for r in part]
+    verts_list, faces_list = [], []
+    nv = 0
+    for v, f in results:
+        verts_list.append(v)
+        faces_list.append(f + nv)
+        nv += len(v)
+    return weld(np.concatenate(verts_list), np.concatenate(faces_list))
+
+def marching_cubes_chunked(voxel, spacing=(1.0, 1.0, 1.0), chunk=32, workers=None):
+    """稠密网格分块 marching cubes，只处理含表面的分块，结果与整体计算相同
+
+    每块负责 chunk^3 个立方体，采样区间多取 +1 层与下一块相接；
+    全空或全满的块不产生三角形，直接跳过。workers 为进程数，默认 CPU 核数。
+    """
+    n = np.array(voxel.shape)
+    tasks = []
+    for x in range(0, n[0] - 1, chunk):
+        for y in range(0, n[1] - 1, chunk):
+            for z in range(0, n[2] - 1, chunk):
+                block = voxel[x:x + chunk + 1, y:y + chunk + 1, z:z + chunk + 1]
+                if block.all() or not block.any():
+                    continue
+                tasks.append((np.ascontiguousarray(block), np.array((x, y, z))))
+    verts, faces = _mesh_chunks(tasks, workers)
+    return verts * np.asarray(spacing, dtype=verts.dtype), faces
+
+def marching_cubes_sparse(hull, spacing=(1.0, 1.0, 1.0), chunk_cells=4, workers=None):
+    """只在含表面的区域分块做 marching cubes，结果与对稠密网格整体计算相同
+
+    每 chunk_cells^3 个叶块为一个分块，分块采样区间多取 +1 层与下一块相接，
+    接缝上两边生成的顶点坐标完全一致（体素单位下为 0.5 的整数倍），最后焊接去重。
+    hull 为 carving.SparseHull。
+    """
+    b = hull.leaf
+    size = b * chunk_cells
+    cells = hull.surface_cells()
+    chunks = np.unique(cells // chunk_cells, axis=0)
+    tasks = []
+    for c in chunks:
+        lo = c * size
+        hi = np.minimum(lo + size + 1, hull.n)
+        if (hi - lo < 2).any():
+            continue
+        block = hull.region(lo, hi)
+        if block.all() or not block.any():
+            continue
+        tasks.append((block, lo))
+    verts, faces = _mesh_chunks(tasks, workers)
+    return verts * np.asarray(spacing, dtype=verts.dtype), faces
+
+def _cluster(verts, faces, origin, cell):
+    # 落在同一格子里的顶点合并为其平均位置，去掉退化和重复的三角形
+    keys = np.floor((verts - origin) / cell).astype(np.int64)
+    uniq, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    counts = np.bincount(inverse, minlength=len(uniq)).astype(np.float64)
+    new_verts = np.empty((len(uniq), 3), dtype=verts.dtype)
+    for k in range(3):
+        new_verts[:, k] = np.bincount(inverse, weights=verts[:, k], minlength=len(uniq)) / counts
+    f = inverse[faces]
+    keep = (f[:, 0] != f[:, 1]) & (f[:, 1] != f[:, 2]) & (f[:, 0] != f[:, 2])
+    f = f[keep]
+    _, first = np.unique(np.sort(f, axis=1), axis=0, return_index=True)
+    f = f[np.sort(first)]
+    # 去掉不再被引用的顶点
+    used, remap = np.unique(f, return_inverse=True)
+    return new_verts[used], remap.reshape(f.shape)
+
+def decimate(verts, faces, max_faces):
+    """顶点聚类简化网格，使三角形数不超过 max_faces
+
+    三角形数大致与格子分辨率的平方成正比，先按比例估计格子大小，
+    超出预算时再逐步放大格子。网格本来就在预算内时原样返回。
+    """
+    if len(faces) <= max_faces:
+        return verts, faces
+    origin = verts.min(axis=0)
+    edge = np.linalg.norm(verts[faces[:, 0]] - verts[faces[:, 1]], axis=1).mean()
+    cell = edge * np.sqrt(len(faces) / max_faces)
+    while True:
+        v, f = _cluster(verts, faces, origin, cell)
+        if len(f) <= max_faces:
+            return v, f
+        cell *= 1.15
@@ -0,0 +1,180 @@
+import bisect
+import cProfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_NULL = nullcontext()
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 't0')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.metrics._stack().append(0.0)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self.t0
+        stack = self.metrics._stack()
+        child = stack.pop()
+        if stack:
+            stack[-1] += dt
+        self.metrics._add(self.name, dt, dt - child)
+        return False
+
+class Metrics:
+    """阶段计时和计数器
+
+    with metrics.stage('解码'): ... 累计每个阶段的调用次数、总耗时和去掉嵌套子阶段后的自身耗时；
+    metrics.count('字节', n) 累加计数。enabled=False 时 stage 返回共用的空上下文，
+    count 直接返回，timed 原样返回迭代器，几乎没有额外开销。
+    profile 为文件路径时 profiling() 期间用 cProfile 采样并写出 .prof 文件。
+    """
+    def __init__(self, enabled=True, profile=None):
+        self.enabled = enabled
+        self.profile_path = profile
+        self.stages = {}  # 阶段名 -> [次数, 总耗时, 自身耗时]
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiler = None
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add(self, name, total, own):
+        with self._lock:
+            s = self.stages.get(name)
+            if s is None:
+                s = self.stages[name] = [0, 0.0, 0.0]
+            s[0] += 1
+            s[1] += total
+            s[2] += own
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL
+        return _Stage(self, name)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed(self, iterable, name):
+        """把从迭代器取下一个元素的等待时间记到 name 阶段（例如边下载边处理）"""
+        if not self.enabled:
+            return iterable
+        return self._timed(iter(iterable), name)
+
+    def _timed(self, it, name):
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+
+    def start_profile(self):
+        if self.profile_path and self._profiler is None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop_profile(self):
+        """停止采样并写出 .prof 文件，可用 python -m pstats 或 snakeviz 查看"""
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_path)
+            self._profiler = None
+
+    @contextmanager
+    def profiling(self):
+        self.start_profile()
+        try:
+            yield
+        finally:
+            self.stop_profile()
+
+    def report(self):
+        with self._lock:
+            return {
+                'stages': {k: {'calls': c, 'total': t, 'self': s} for k, (c, t, s) in self.stages.items()},
+                'counters': dict(self.counters),
+            }
+
+    def summary(self):
+        """按自身耗时从大到小排列的文本报告"""
+        rep = self.report()
+        total = sum(s['self'] for s in rep['stages'].values()) or 1.0
+        lines = [f"{'阶段':<12}{'次数':>8}{'总耗时(s)':>12}{'自身(s)':>10}{'占比':>8}"]
+        for name, s in sorted(rep['stages'].items(), key=lambda kv: -kv[1]['self']):
+            lines.append(f"{name:<12}{s['calls']:>8}{s['total']:>12.3f}{s['self']:>10.3f}"
+                         f"{s['self'] / total:>8.1%}")
+        for name, v in sorted(rep['counters'].items()):
+            lines.append(f"{name}: {v}")
+        return '\n'.join(lines)
+
+class Histogram:
+    """按标签分组的延迟直方图，输出 Prometheus 文本格式"""
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}  # 标签值 -> [各桶计数..., 超出最大桶的次数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self.series.get(labels)
+            if s is None:
+                s = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    def snapshot(self):
+        """JSON 友好的形式：[{labels..., count, sum, buckets: {上界: 累计次数}}]"""
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self.series.items())
+        out = []
+        for labels, s in items:
+            cum, buckets = 0, {}
+            for b, c in zip(self.buckets, s):
+                cum += c
+                buckets[str(b)] = cum
+            out.append(dict(zip(self.label_names, labels), count=cum + s[len(self.buckets)],
+                            sum=s[-1], buckets=buckets))
+        return out
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self.series.items())
+        for labels, s in items:
+            base = ''.join(f'{n}="{_escape(v)}",' for n, v in zip(self.label_names, labels))
+            tail = '{' + base[:-1] + '}' if base else ''
+            cum = 0
+            for b, c in zip(self.buckets, s):
+                cum += c
+                lines.append(f'{self.name}_bucket{{{base}le="{b}"}} {cum}')
+            count = cum + s[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{base}le="+Inf"}} {count}')
+            lines.append(f'{self.name}_count{tail} {count}')
+            lines.append(f'{self.name}_sum{tail} {s[-1]}')
+        return lines
+
+def _escape(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
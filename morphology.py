@@ -0,0 +1,158 @@
+import numpy as np
+
+from carving import SparseHull, EMPTY, FULL, PARTIAL
+
+WORD = 64
+
+def pack(voxel):
+    """(X,Y,Z) bool 沿 z 按位打包成 (X,Y,ceil(Z/64)) uint64，z=0 在最低位"""
+    x, y, z = voxel.shape
+    nbytes = -(-z // WORD) * (WORD // 8)
+    bits = np.packbits(voxel, axis=-1, bitorder='little')
+    if bits.shape[-1] < nbytes:
+        bits = np.pad(bits, ((0, 0), (0, 0), (0, nbytes - bits.shape[-1])))
+    return np.ascontiguousarray(bits).view('<u8')
+
+def unpack(words, z):
+    return np.unpackbits(words.view(np.uint8), axis=-1, count=z, bitorder='little').astype(bool)
+
+def _tail_mask(z):
+    # 最后一个字里超出 z 的位清零，补出的位始终当作网格外
+    words = -(-z // WORD)
+    mask = np.full(words, ~np.uint64(0), dtype='<u8')
+    rem = z % WORD
+    if rem:
+        mask[-1] = np.uint64((1 << rem) - 1)
+    return mask
+
+def _shift(words, axis, k):
+    """整体平移 k 个体素（k>0 朝坐标增大方向），移出网格的补 0"""
+    out = np.zeros_like(words)
+    if axis < 2:
+        src = [slice(None)] * 3
+        dst = [slice(None)] * 3
+        if k > 0:
+            src[axis] = slice(None, -k)
+            dst[axis] = slice(k, None)
+        else:
+            src[axis] = slice(-k, None)
+            dst[axis] = slice(None, k)
+        out[tuple(dst)] = words[tuple(src)]
+        return out
+    # z 方向在字内移位，跨字的位从相邻字补进来
+    k64 = np.uint64(abs(k))
+    back = np.uint64(WORD - abs(k))
+    if k > 0:
+        np.left_shift(words, k64, out=out)
+        out[..., 1:] |= words[..., :-1] >> back
+    else:
+        np.right_shift(words, k64, out=out)
+        out[..., :-1] |= words[..., 1:] << back
+    return out
+
+def _pass(words, radius, z, dilate, valid=None):
+    # 立方体结构元素可分离：依次沿 x、y、z 做一维窗口 OR(膨胀)/AND(腐蚀)
+    # valid 为网格内区域的打包 mask，每步之后网格外清零（相当于 scipy 的 border_value=0）
+    tail = _tail_mask(z) if valid is None else valid
+    for axis in range(3):
+        acc = words.copy()
+        for k in range(1, radius + 1):
+            for d in (k, -k):
+                s = _shift(words, axis, d)
+                if dilate:
+                    acc |= s
+                else:
+                    acc &= s
+        words = acc & tail
+    return words
+
+def dilate(words, z, radius=1, valid=None):
+    return _pass(words, radius, z, True, valid)
+
+def erode(words, z, radius=1, valid=None):
+    return _pass(words, radius, z, False, valid)
+
+def binary_closing(voxel, radius=1):
+    """与 scipy.ndimage.binary_closing(voxel, structure=np.ones((2r+1,)*3)) 相同"""
+    z = voxel.shape[-1]
+    return unpack(erode(dilate(pack(voxel), z, radius), z, radius), z)
+
+def binary_opening(voxel, radius=1):
+    """与 scipy.ndimage.binary_opening(voxel, structure=np.ones((2r+1,)*3)) 相同"""
+    z = voxel.shape[-1]
+    return unpack(dilate(erode(pack(voxel), z, radius), z, radius), z)
+
+def smooth(voxel, radius=1, inside=None):
+    """先闭运算再开运算，全程在打包数据上完成
+
+    inside 为 (lo, hi) 时只有这个范围算网格内，范围外每步都当作 0，
+    用于分块计算时块的一部分落在整个网格外面的情况。
+    """
+    if radius >= WORD:
+        raise ValueError(f"radius 必须小于 {WORD}")
+    z = voxel.shape[-1]
+    valid = None
+    if inside is not None:
+        m = np.zeros(voxel.shape, dtype=bool)
+        (x0, y0, z0), (x1, y1, z1) = inside
+        m[x0:x1, y0:y1, z0:z1] = True
+        valid = pack(m)
+    w = pack(voxel)
+    w = erode(dilate(w, z, radius, valid), z, radius, valid)
+    w = dilate(erode(w, z, radius, valid), z, radius, valid)
+    return unpack(w, z)
+
+def _band_cells(state, reach):
+    # 周围 reach 个叶块内状态不一致（网格外按空处理）的块才可能被平滑改变
+    padded = np.pad(state, reach, constant_values=EMPTY)
+    lo = np.full(state.shape, 255, dtype=np.uint8)
+    hi = np.zeros(state.shape, dtype=np.uint8)
+    s = state.shape
+    for dx in range(2 * reach + 1):
+        for dy in range(2 * reach + 1):
+            for dz in range(2 * reach + 1):
+                win = padded[dx:dx + s[0], dy:dy + s[1], dz:dz + s[2]]
+                np.minimum(lo, win, out=lo)
+                np.maximum(hi, win, out=hi)
+    return (lo != hi) | (state == PARTIAL)
+
+def smooth_sparse(hull, radius=1, chunk_cells=4):
+    """只在表面附近的带状区域上做 smooth，返回新的 SparseHull
+
+    闭+开运算共 4 次膨胀/腐蚀，每个体素只受 4*radius 范围内的体素影响；
+    离表面和网格边界更远的整块保持不变。分块计算时四周各多取 4*radius 的边，
+    所以结果与对稠密网格整体 smooth 相同。
+    """
+    b = hull.leaf
+    halo = 4 * radius
+    reach = -(-halo // b)
+    band = _band_cells(hull.state, reach)
+    size = b * chunk_cells
+    state = hull.state.copy()
+    leaves = {tuple(c): hull.leaf_bits[i] for i, c in enumerate(hull.leaf_coords)}
+    for ch in np.unique(np.argwhere(band) // chunk_cells, axis=0):
+        lo = ch * size
+        hi = lo + size
+        glo = np.maximum(lo - halo, 0)
+        block = hull.region(glo, hi + halo)
+        front = glo - (lo - halo)
+        block = np.pad(block, [(int(f), 0) for f in front])
+        # 块内落在网格外的部分每一步都保持为 0，与整体计算一致
+        inside = (front, np.minimum(hi + halo, hull.n) - (lo - halo))
+        out = smooth(block, radius, inside)[halo:halo + size, halo:halo + size, halo:halo + size]
+        c0 = ch * chunk_cells
+        sub_band = band[c0[0]:c0[0] + chunk_cells, c0[1]:c0[1] + chunk_cells, c0[2]:c0[2] + chunk_cells]
+        for c in np.argwhere(sub_band):
+            cell = tuple(c + c0)
+            v = out[c[0] * b:(c[0] + 1) * b, c[1] * b:(c[1] + 1) * b, c[2] * b:(c[2] + 1) * b]
+            leaves.pop(cell, None)
+            if v.all():
+                state[cell] = FULL
+            elif not v.any():
+                state[cell] = EMPTY
+            else:
+                state[cell] = PARTIAL
+                leaves[cell] = np.packbits(v, axis=-1)
+    coords = np.array(sorted(leaves), dtype=np.intp).reshape(-1, 3)
+    bits = np.array([leaves[tuple(c)] for c in coords], dtype=np.uint8).reshape(-1, b, b, b // 8)
+    return SparseHull(hull.n, b, state, coords, bits)
@@ -0,0 +1,225 @@
+import os
+import struct
+import tempfile
+import cv2
+import numpy as np
+
+# 只处理这些后缀的图片
+ALLOWED_EXTS = {'.jpg', '.jpeg', '.png', '.bmp'}
+def is_image_file(fname):
+    return os.path.splitext(fname)[1].lower() in ALLOWED_EXTS
+
+def get_largest_object_mask(gray, threshold=30):
+    _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    if num_labels <= 1:
+        return np.zeros_like(gray, dtype=bool)
+    largest_label = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+    mask = (labels == largest_label)
+    return mask
+
+def gray_and_mask(img):
+    """由解码后的图片得到 (灰度图, 有效像素mask)，不支持的通道数返回 None"""
+    if img is None:
+        return None
+    if len(img.shape) == 2:
+        gray = img
+        mask = np.ones_like(gray, dtype=bool)
+    elif len(img.shape) == 3 and img.shape[2] == 3:
+        b, g, r = cv2.split(img)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        # 绿色像素点过滤：G通道比R、B都高且高出一定阈值
+        mask = ~((g > r + 30) & (g > b + 30))
+    elif len(img.shape) == 3 and img.shape[2] == 4:
+        b, g, r, a = cv2.split(img)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY)
+        mask = ~((g > r + 30) & (g > b + 30))
+    else:
+        return None
+    # 只保留中心物体
+    object_mask = get_largest_object_mask(gray)
+    return gray, mask & object_mask
+
+# 按 1/2、1/4、1/8 分辨率解码；JPEG 在 DCT 阶段直接缩小，其他格式解码后立即缩小
+_REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+REDUCE_FACTORS = (1,) + tuple(_REDUCED_FLAGS)
+
+def image_size(path):
+    """只读文件头得到原图 (高, 宽)，支持 JPEG/PNG/BMP，无法识别时返回 None"""
+    with open(path, 'rb') as f:
+        head = f.read(26)
+        if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+            w, h = struct.unpack('>II', head[16:24])
+            return h, w
+        if head[:2] == b'BM' and len(head) == 26:
+            w, h = struct.unpack('<ii', head[18:26])
+            return abs(h), w
+        if head[:2] != b'\xff\xd8':
+            return None
+        # 逐个跳过 JPEG 段，直到 SOF 段（C4/C8/CC 不是 SOF）
+        f.seek(2)
+        while True:
+            if f.read(1) != b'\xff':
+                return None
+            marker = f.read(1)
+            while marker == b'\xff':
+                marker = f.read(1)
+            if not marker:
+                return None
+            m = marker[0]
+            if m == 0x01 or 0xd0 <= m <= 0xd9:
+                continue
+            seg = f.read(2)
+            if len(seg) < 2:
+                return None
+            if 0xc0 <= m <= 0xcf and m not in (0xc4, 0xc8, 0xcc):
+                data = f.read(5)
+                if len(data) < 5:
+                    return None
+                return struct.unpack('>HH', data[1:5])
+            f.seek(struct.unpack('>H', seg)[0] - 2, os.SEEK_CUR)
+
+def read_frame(path, reduce=1):
+    """解码图片并抠图，返回传给 batch_points/stream_points 的一帧，失败返回 None
+
+    reduce=1 与原来 IMREAD_UNCHANGED 全分辨率解码相同；reduce 为 2/4/8 时按缩小的
+    分辨率解码，颜色过滤和连通域都在小图上计算，帧中另外记下缩小倍数和原图尺寸，
+    采样时原图第 k*step 行/列取小图中覆盖它的像素，坐标网格与全分辨率相同；
+    但 mask 是在小图上算的，边缘处会有百分之几的采样点进出，点集只是近似。
+    """
+    if reduce == 1:
+        return gray_and_mask(cv2.imread(path, cv2.IMREAD_UNCHANGED))
+    # 与 IMREAD_UNCHANGED 一样不按 EXIF 旋转
+    img = cv2.imread(path, _REDUCED_FLAGS[reduce] | cv2.IMREAD_IGNORE_ORIENTATION)
+    frame = gray_and_mask(img)
+    if frame is None:
+        return None
+    size = image_size(path) or (img.shape[0] * reduce, img.shape[1] * reduce)
+    return frame + (reduce, size)
+
+def _sample(gray, mask, step, reduce=1, size=None):
+    # 步长切片只取采样点，复制出来以免切片视图拖住整张原图
+    # 返回 (采样灰度, 采样mask, 原图高度)
+    if reduce == 1:
+        return (np.ascontiguousarray(gray[::step, ::step]),
+                np.ascontiguousarray(mask[::step, ::step]), gray.shape[0])
+    # 缩小解码的帧：原图采样位置映射到小图中对应的像素，花式索引得到的已是副本
+    h, w = size
+    rows = np.minimum(np.arange(0, h, step) // reduce, gray.shape[0] - 1)
+    cols = np.minimum(np.arange(0, w, step) // reduce, gray.shape[1] - 1)
+    idx = np.ix_(rows, cols)
+    return gray[idx], mask[idx], h
+
+def _fill(out, g_s, m_s, height, step, z_scale):
+    # 布尔索引按行优先顺序取点，与逐像素循环 for y: for x: 的顺序一致
+    ys, xs = np.nonzero(m_s)
+    out[:, 0] = xs * step
+    out[:, 1] = (height - 1) - ys * step  # y轴翻转
+    # 先按 float64 计算 z 再转 float32，与原 float(gray)/255.0*z_scale 一致
+    out[:, 2] = g_s[m_s] / 255.0 * z_scale
+
+def image_points(gray, mask, step=18, z_scale=50.0, reduce=1, size=None):
+    """单张图片的采样点云，返回预分配的 float32 (N,3) 数组"""
+    g_s, m_s, height = _sample(gray, mask, step, reduce, size)
+    out = np.empty((int(np.count_nonzero(m_s)), 3), dtype=np.float32)
+    _fill(out, g_s, m_s, height, step, z_scale)
+    return out
+
+def batch_points(frames, step=18, z_scale=50.0, indexed=False):
+    """多张图片 (gray, mask) 合并成一个 float32 (N,3) 数组
+
+    先只保留采样后的小图并统计点数，再一次性分配结果数组按偏移写入，
+    不做 Python 层的列表拼接。
+    indexed=True 时 frames 为 (下标, 帧)，可以按任意先后到达，结果按下标顺序排列。
+    """
+    samples = []
+    total = 0
+    for item in frames:
+        i, frame = item if indexed else (len(samples), item)
+        s = _sample(*frame[:2], step, *frame[2:])
+        n = int(np.count_nonzero(s[1]))
+        samples.append((i, s, n))
+        total += n
+    if indexed:
+        samples.sort(key=lambda x: x[0])
+    out = np.empty((total, 3), dtype=np.float32)
+    offset = 0
+    for _, (g_s, m_s, height), n in samples:
+        _fill(out[offset:offset + n], g_s, m_s, height, step, z_scale)
+        offset += n
+    return out
+
+class PointStats:
+    """逐块累积点云的数量、坐标和、各轴最小/最大值，用于流式归一化"""
+    def __init__(self):
+        self.count = 0
+        self.sum = np.zeros(3, dtype=np.float64)
+        self.min = np.full(3, np.inf)
+        self.max = np.full(3, -np.inf)
+
+    def update(self, points):
+        if len(points) == 0:
+            return
+        self.count += len(points)
+        self.sum += points.sum(axis=0, dtype=np.float64)
+        self.min = np.minimum(self.min, points.min(axis=0))
+        self.max = np.maximum(self.max, points.max(axis=0))
+
+    @property
+    def center(self):
+        return self.sum / self.count
+
+    def max_range(self, dtype=np.float32):
+        # 与整体相减后取 abs().max() 相同：舍入单调，只需看各轴最小/最大值
+        c = self.center
+        hi = (self.max - c).astype(dtype)
+        lo = (self.min - c).astype(dtype)
+        return float(max(np.abs(hi).max(), np.abs(lo).max()))
+
+def apply_normalization(points, center, max_range):
+    points -= center
+    if max_range > 0:
+        points /= max_range
+        points *= 100
+    return points
+
+def normalize_points(points):
+    """原地居中并归一化到[-100,100]，统计量用 float64 计算"""
+    stats = PointStats()
+    stats.update(points)
+    return apply_normalization(points, stats.center, stats.max_range(points.dtype))
+
+def stream_points(frames, out_path, step=18, z_scale=50.0, chunk=1 << 20):
+    """两遍流式生成归一化点云，写入内存映射的 .npy 文件 out_path
+
+    第一遍逐张生成点，累积统计量并把原始点顺序追加到临时文件；
+    第二遍按 chunk 个点读回、归一化后写入 out_path。
+    内存占用只与单张图片和 chunk 有关，与图片总数无关。
+    返回 out_path 的只读 memmap，没有点时返回 None。
+    """
+    stats = PointStats()
+    fd, spill_path = tempfile.mkstemp(suffix='.raw', dir=os.path.dirname(os.path.abspath(out_path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for frame in frames:
+                pts = image_points(*frame[:2], step, z_scale, *frame[2:])
+                stats.update(pts)
+                f.write(pts.tobytes())
+        if stats.count == 0:
+            return None
+        center, max_range = stats.center, stats.max_range()
+        raw = np.memmap(spill_path, dtype=np.float32, mode='r', shape=(stats.count, 3))
+        out = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float32, shape=(stats.count, 3))
+        for i in range(0, stats.count, chunk):
+            block = out[i:i + chunk]
+            block[:] = raw[i:i + chunk]
+            apply_normalization(block, center, max_range)
+        out.flush()
+        del raw, out
+    finally:
+        os.remove(spill_path)
+    return np.load(out_path, mmap_mode='r')
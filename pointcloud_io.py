@@ -0,0 +1,131 @@
+import os
+import numpy as np
+
+CHUNK_POINTS = 1 << 20  # 二进制格式每次写出的点数
+CSV_CHUNK_POINTS = 1 << 16  # 文本格式每块点数，控制临时字符串大小
+FORMATS = ('ply', 'npy', 'npz', 'csv')
+
+_PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+
+def _format_of(path, fmt):
+    fmt = (fmt or os.path.splitext(path)[1].lstrip('.')).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的点云格式: {fmt}，可选 {', '.join(FORMATS)}")
+    return fmt
+
+def ply_header(count, dtype='float', faces=None):
+    face = ''
+    if faces is not None:
+        face = (f'element face {faces}\n'
+                'property list uchar int vertex_indices\n')
+    return ('ply\n'
+            'format binary_little_endian 1.0\n'
+            f'element vertex {count}\n'
+            f'property {dtype} x\n'
+            f'property {dtype} y\n'
+            f'property {dtype} z\n'
+            f'{face}'
+            'end_header\n').encode('ascii')
+
+def write_points(path, points, fmt=None, chunk=CHUNK_POINTS):
+    """把 (N,3) 点云写到 path，格式由 fmt 或扩展名决定
+
+    ply 为二进制小端 float32，npy/npz 直接保存数组，csv 保持原 x,y,z 文本格式。
+    ply/csv 按 chunk 个点分块从数组写出，不逐行格式化。
+    """
+    fmt = _format_of(path, fmt)
+    points = np.asarray(points)
+    if fmt == 'npy':
+        np.save(path, points.astype(np.float32, copy=False))
+        return
+    if fmt == 'npz':
+        np.savez(path, points=points.astype(np.float32, copy=False))
+        return
+    if fmt == 'ply':
+        with open(path, 'wb') as f:
+            f.write(ply_header(len(points)))
+            for i in range(0, len(points), chunk):
+                f.write(np.ascontiguousarray(points[i:i + chunk], dtype='<f4').tobytes())
+        return
+    # float32 用 9 位有效数字即可精确还原，比 repr 快得多
+    row = '%.9g,%.9g,%.9g\n' if points.dtype == np.float32 else '%r,%r,%r\n'
+    with open(path, 'w') as f:
+        f.write('x,y,z\n')
+        for i in range(0, len(points), CSV_CHUNK_POINTS):
+            block = points[i:i + CSV_CHUNK_POINTS]
+            # 一次格式化整块，避免每个点一个 f-string
+            f.write((row * len(block)) % tuple(block.ravel().tolist()))
+
+def write_mesh(path, verts, faces, chunk=CHUNK_POINTS):
+    """三角网格写成二进制小端 PLY：float32 顶点，每个面为 uchar 3 + 三个 int32 索引"""
+    verts = np.asarray(verts)
+    faces = np.asarray(faces)
+    rec = np.dtype([('n', 'u1'), ('idx', '<i4', 3)])
+    with open(path, 'wb') as f:
+        f.write(ply_header(len(verts), faces=len(faces)))
+        for i in range(0, len(verts), chunk):
+            f.write(np.ascontiguousarray(verts[i:i + chunk], dtype='<f4').tobytes())
+        for i in range(0, len(faces), chunk):
+            block = np.empty(len(faces[i:i + chunk]), dtype=rec)
+            block['n'] = 3
+            block['idx'] = faces[i:i + chunk]
+            f.write(block.tobytes())
+
+def _read_ply(path):
+    with open(path, 'rb') as f:
+        if f.readline().strip() != b'ply':
+            raise ValueError(f"{path} 不是 PLY 文件")
+        fmt = None
+        count = None
+        props = []
+        in_vertex = False
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"{path} PLY 头不完整")
+            words = line.decode('ascii').split()
+            if not words:
+                continue
+            if words[0] == 'format':
+                fmt = words[1]
+            elif words[0] == 'element':
+                in_vertex = words[1] == 'vertex'
+                if in_vertex:
+                    count = int(words[2])
+            elif words[0] == 'property' and in_vertex:
+                if words[1] == 'list':
+                    raise ValueError("不支持顶点上的 list 属性")
+                props.append((words[2], _PLY_TYPES[words[1]]))
+            elif words[0] == 'end_header':
+                break
+        if fmt == 'ascii':
+            data = np.loadtxt(f, dtype=np.float64, max_rows=count, ndmin=2)
+            names = [p[0] for p in props]
+            return data[:, [names.index(c) for c in 'xyz']].astype(np.float32)
+        endian = {'binary_little_endian': '<', 'binary_big_endian': '>'}[fmt]
+        dtype = np.dtype([(name, endian + t) for name, t in props])
+        data = np.fromfile(f, dtype=dtype, count=count)
+    out = np.empty((len(data), 3), dtype=np.float32)
+    for i, c in enumerate('xyz'):
+        out[:, i] = data[c]
+    return out
+
+def load_points(path, fmt=None, mmap=False):
+    """读取 write_points 写出的点云，返回 float32 (N,3) 数组
+
+    mmap=True 时 npy 以内存映射方式打开，不整体读入。
+    """
+    fmt = _format_of(path, fmt)
+    if fmt == 'npy':
+        return np.load(path, mmap_mode='r' if mmap else None)
+    if fmt == 'npz':
+        with np.load(path) as z:
+            return z['points']
+    if fmt == 'ply':
+        return _read_ply(path)
+    return np.loadtxt(path, delimiter=',', skiprows=1, dtype=np.float32, ndmin=2)
@@ -0,0 +1,125 @@
+import json
+import os
+
+import numpy as np
+
+from pointcloud import PointStats, apply_normalization
+from pointcloud_io import write_points
+
+MANIFEST = 'manifest.json'
+
+def params_tag(step, z_scale, reduce=1, scale=None):
+    """采样参数标记，参数不同的点分开存放"""
+    tag = f's{step}-z{z_scale:g}-r{reduce}'
+    if scale:
+        tag += f'-x{scale:g}'
+    return tag
+
+class PointStore:
+    """持久化的逐图片点云库，app.py --follow 用
+
+    每张图片的原始（未归一化）采样点存为 <root>/<参数标记>/<内容哈希>.npy，
+    manifest.json 按到达顺序记录当前的图片集合和累积统计量（点数、坐标和、最小/最大值）。
+    新图片只需算自己的点并更新统计量；重启后已算过的图片直接复用。
+    """
+    def __init__(self, root, tag):
+        self.dir = os.path.join(root, tag)
+        os.makedirs(self.dir, exist_ok=True)
+        self.images = {}  # 文件名 -> {'hash', 'count'}，保持到达顺序
+        self.stats = PointStats()
+        try:
+            with open(os.path.join(self.dir, MANIFEST), 'r', encoding='utf-8') as f:
+                m = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.images = {name: e for name, e in m['images'].items() if self.has(e['hash'])}
+        if len(self.images) == len(m['images']):
+            s = m['stats']
+            self.stats.count = s['count']
+            self.stats.sum = np.asarray(s['sum'])
+            self.stats.min = np.asarray(s['min'])
+            self.stats.max = np.asarray(s['max'])
+        else:
+            # 有点文件丢失，按剩下的重新统计
+            self._restat()
+
+    def __contains__(self, name):
+        return name in self.images
+
+    def __len__(self):
+        return len(self.images)
+
+    @property
+    def count(self):
+        return self.stats.count
+
+    def _path(self, digest):
+        return os.path.join(self.dir, digest + '.npy')
+
+    def has(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def load(self, digest):
+        return np.load(self._path(digest))
+
+    def add(self, name, digest, points=None):
+        """登记一张图片；points 为 None 时复用已存的同内容点"""
+        if points is None:
+            points = self.load(digest)
+        else:
+            tmp = os.path.join(self.dir, digest + '.tmp.npy')
+            np.save(tmp, points.astype(np.float32, copy=False))
+            os.replace(tmp, self._path(digest))
+        self.images[name] = {'hash': digest, 'count': len(points)}
+        self.stats.update(points)
+
+    def _restat(self):
+        self.stats = PointStats()
+        for e in self.images.values():
+            self.stats.update(self.load(e['hash']))
+
+    def sync(self, names):
+        """只保留 names 中的图片（服务端已删除的去掉），返回是否有变化"""
+        keep = set(names)
+        gone = [n for n in self.images if n not in keep]
+        for n in gone:
+            del self.images[n]
+        if gone:
+            self._restat()
+        return bool(gone)
+
+    def clear(self):
+        self.images = {}
+        self.stats = PointStats()
+        for fname in os.listdir(self.dir):
+            if fname.endswith('.npy'):
+                os.remove(os.path.join(self.dir, fname))
+
+    def save(self):
+        s = self.stats
+        m = {'images': self.images,
+             'stats': {'count': s.count, 'sum': s.sum.tolist(), 'min': s.min.tolist(), 'max': s.max.tolist()}}
+        tmp = os.path.join(self.dir, MANIFEST + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(m, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.dir, MANIFEST))
+
+    def points(self):
+        """按到达顺序拼接、用累积统计量归一化到[-100,100]的 float32 (N,3) 数组"""
+        out = np.empty((self.stats.count, 3), dtype=np.float32)
+        offset = 0
+        for e in self.images.values():
+            out[offset:offset + e['count']] = self.load(e['hash'])
+            offset += e['count']
+        if len(out):
+            apply_normalization(out, self.stats.center, self.stats.max_range())
+        return out
+
+    def write(self, path):
+        """归一化后写到 path，先写临时文件再替换，读者不会看到写了一半的文件"""
+        points = self.points()
+        base, ext = os.path.splitext(path)
+        tmp = base + '.tmp' + ext
+        write_points(tmp, points)
+        os.replace(tmp, path)
+        return points
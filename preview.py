@@ -0,0 +1,91 @@
+import cv2
+import numpy as np
+
+def _grid_first(points, lo, cell):
+    # 每个占据格子中第一个点的下标
+    keys = ((points - lo) / cell).astype(np.int64)
+    dims = keys.max(axis=0) + 1
+    flat = (keys[:, 0] * dims[1] + keys[:, 1]) * dims[2] + keys[:, 2]
+    return np.unique(flat, return_index=True)[1]
+
+def voxel_downsample(points, max_points=200000, tries=8):
+    """体素网格降采样，每个格子保留一个点，点数不超过 max_points
+
+    占据格子数大致与格子边长的平方（表面）到立方（实体）成反比，按平方关系
+    调整边长几次，取不超过 max_points 的结果中点数最多的一次；保留每格中第一个点，顺序不变。
+    """
+    points = np.asarray(points)
+    if len(points) <= max_points:
+        return points
+    lo = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lo, 1e-9)
+    cell = float(np.cbrt(np.prod(extent) / max_points))
+    best = None
+    for _ in range(tries):
+        first = _grid_first(points, lo, cell)
+        if len(first) <= max_points:
+            if best is None or len(first) > len(best):
+                best = first
+            if len(first) >= 0.8 * max_points:
+                break
+        cell *= np.sqrt(len(first) / (0.9 * max_points))
+    while best is None:
+        # 仍然超出时继续放大直到满足
+        cell *= 1.25
+        first = _grid_first(points, lo, cell)
+        if len(first) <= max_points:
+            best = first
+    return points[np.sort(best)]
+
+def _disk(radius):
+    r = int(radius)
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    keep = dx * dx + dy * dy <= radius * radius
+    return dy[keep], dx[keep]
+
+def render_preview(points, path, size=1600, elev=30.0, azim=-60.0, point_size=2.0,
+                   max_points=200000, background=255):
+    """不依赖 matplotlib 的点云预览：正交投影 + z-buffer 圆点，按 z 值着色（viridis）
+
+    视角与 matplotlib 3D 默认相同（elev=30, azim=-60）。点数过多时先做体素降采样，
+    远处的点略暗，便于看出前后关系。结果写到 path，返回渲染用的点数。
+    """
+    pts = voxel_downsample(points, max_points).astype(np.float64)
+    img = np.full((size, size, 3), background, dtype=np.uint8)
+    if len(pts) == 0:
+        cv2.imwrite(path, img)
+        return 0
+    el, az = np.radians(elev), np.radians(azim)
+    x, y, z = pts[:, 0], pts[:, 1], pts[:, 2]
+    sx = -np.sin(az) * x + np.cos(az) * y
+    sy = -np.sin(el) * np.cos(az) * x - np.sin(el) * np.sin(az) * y + np.cos(el) * z
+    depth = np.cos(el) * np.cos(az) * x + np.cos(el) * np.sin(az) * y + np.sin(el) * z  # 越大越近
+
+    # 缩放到图像内，四周留边
+    margin = 0.05 * size + point_size
+    span = max(np.ptp(sx), np.ptp(sy), 1e-9)
+    scale = (size - 2 * margin) / span
+    u = ((sx - (sx.min() + sx.max()) / 2) * scale + size / 2).astype(np.int64)
+    v = (size / 2 - (sy - (sy.min() + sy.max()) / 2) * scale).astype(np.int64)
+
+    # 按 z 着色，远近调整亮度
+    zn = np.clip((z - z.min()) / max(np.ptp(z), 1e-9) * 255, 0, 255).astype(np.uint8)
+    color = cv2.applyColorMap(zn.reshape(-1, 1), cv2.COLORMAP_VIRIDIS).reshape(-1, 3)
+    shade = 0.6 + 0.4 * (depth - depth.min()) / max(np.ptp(depth), 1e-9)
+    color = (color * shade[:, None]).astype(np.uint8)
+
+    # 每个点展开成圆点；z-buffer 存每个像素上最近点的名次（0 为最近）
+    n = len(pts)
+    by_depth = np.argsort(-depth, kind='stable')
+    rank = np.empty(n, dtype=np.int64)
+    rank[by_depth] = np.arange(n)
+    dy, dx = _disk(point_size)
+    pu = (u[:, None] + dx[None, :]).ravel()
+    pv = (v[:, None] + dy[None, :]).ravel()
+    ok = (pu >= 0) & (pu < size) & (pv >= 0) & (pv < size)
+    zbuf = np.full(size * size, n, dtype=np.int64)
+    np.minimum.at(zbuf, pv[ok] * size + pu[ok], np.repeat(rank, len(dx))[ok])
+    hit = zbuf < n
+    img.reshape(-1, 3)[hit] = color[by_depth][zbuf[hit]]
+    cv2.imwrite(path, img)
+    return len(pts)
@@ -0,0 +1,116 @@
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+from metrics import Metrics
+from reconstruct import count_stage
+
+class ReconstructWorker(QThread):
+    """在后台线程中依次执行重建的各个阶段，GUI 线程只通过信号接收进度和结果
+
+    stages 为 [(阶段名, 函数)]，每个函数接收上一阶段的结果，第一个接收 data。
+    cancel() 后当前阶段算完即停止，不再发出 done/failed，
+    调用方可以立即启动新的 worker 重新开始，旧线程在后台自行结束。
+    metrics 记录各阶段耗时和计数，带 profile 路径时整个 run 在 cProfile 下执行。
+    """
+    progress = pyqtSignal(int, int, str)  # 阶段序号, 阶段总数, 阶段名
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, stages, data=None, metrics=None, parent=None):
+        super().__init__(parent)
+        self.stages = stages
+        self.data = data
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        data = self.data
+        self.data = None
+        total = len(self.stages)
+        metrics = self.metrics
+        try:
+            # cProfile 只采样调用 enable 的线程，所以在 worker 线程内开启
+            with metrics.profiling():
+                for i, (name, fn) in enumerate(self.stages):
+                    if self._cancelled:
+                        return
+                    self.progress.emit(i, total, name)
+                    with metrics.stage(name):
+                        data = fn(data)
+                    count_stage(metrics, name, data)
+        except Exception as e:
+            if not self._cancelled:
+                self.failed.emit(f'{type(e).__name__}: {e}')
+            return
+        if not self._cancelled:
+            self.progress.emit(total, total, '完成')
+            self.done.emit(data)
+
+class WorkerSlot(QObject):
+    """窗口持有的“当前重建任务”
+
+    start() 会取消仍在运行的旧任务再启动新任务（重新开始），
+    旧线程结束前保留引用，避免 QThread 在运行中被回收。
+    本对象属于 GUI 线程，worker 的信号经排队连接在 GUI 线程中处理。
+    """
+    def __init__(self, on_progress, on_done, on_failed, parent=None):
+        super().__init__(parent)
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_failed = on_failed
+        self.current = None
+        self._running = set()
+
+    def start(self, stages, data=None, metrics=None):
+        self.cancel()
+        worker = ReconstructWorker(stages, data, metrics)
+        worker.progress.connect(self._progress)
+        worker.done.connect(self._done)
+        worker.failed.connect(self._failed)
+        worker.finished.connect(self._reap)
+        self._running.add(worker)
+        self.current = worker
+        worker.start()
+        return worker
+
+    # 只有当前任务的信号才转给窗口，被取消的旧任务即使已排队的信号也丢弃
+    @pyqtSlot(int, int, str)
+    def _progress(self, i, total, name):
+        if self.sender() is self.current:
+            self.on_progress(i, total, name)
+
+    @pyqtSlot(object)
+    def _done(self, result):
+        if self.sender() is self.current:
+            self.current = None
+            self.on_done(result)
+
+    @pyqtSlot(str)
+    def _failed(self, msg):
+        if self.sender() is self.current:
+            self.current = None
+            self.on_failed(msg)
+
+    @pyqtSlot()
+    def _reap(self):
+        self._running.discard(self.sender())
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+            self.current = None
+
+    def busy(self):
+        return self.current is not None
+
+    def shutdown(self, timeout_ms=5000):
+        """窗口关闭时调用：取消并等待所有后台线程结束"""
+        self.cancel()
+        for worker in list(self._running):
+            worker.cancel()
+            worker.wait(timeout_ms)
@@ -0,0 +1,268 @@
+"""不依赖 GUI 的六面体素重建：抠图 -> 雕刻 -> 平滑 -> 网格/点云导出
+
+既给两个 Qt 窗口的后台线程用，也可以在命令行批量处理多组照片：
+
+    python reconstruct.py captures/ -o out --mode mesh --n 128 --workers 4
+
+每组照片是一个目录，里面按 front/back/left/right/top/bottom 命名六张图；
+给出的目录本身没有照片时，把它的各个子目录当作一组。
+
+目录中有 cameras.json 时按标定多视图处理，照片数量和角度任意：
+
+    {"bounds": [[x0, y0, z0], [x1, y1, z1]],
+     "views": [{"image": "001.jpg", "K": [[...]], "R": [[...]], "t": [...]}, ...]}
+
+K 为 3x3 内参，R/t 为世界坐标到相机坐标的外参，bounds 为重建范围。
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from pointcloud import ALLOWED_EXTS
+from pointcloud_io import FORMATS, write_points, write_mesh
+from carving import carve, carve_sparse, carve_views, occupied, count_occupied, SparseHull
+from morphology import smooth, smooth_sparse
+from meshing import marching_cubes_chunked, marching_cubes_sparse, decimate
+from metrics import Metrics
+
+FACE_NAMES = ['front', 'back', 'left', 'right', 'top', 'bottom']
+CAMERAS_FILE = 'cameras.json'
+
+def mask_threshold(img):
+    # 简单阈值抠图，假设背景为白色
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    _, mask = cv2.threshold(gray, 220, 255, cv2.THRESH_BINARY_INV)
+    return mask // 255  # 0/1
+
+def mask_otsu(img):
+    # 智能抠图：自动阈值+形态学+平滑
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    # OTSU自动阈值
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # 闭运算填补小孔
+    kernel = np.ones((5,5), np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    # 开运算去除小噪点
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+    # 边缘平滑
+    mask = cv2.GaussianBlur(mask, (3,3), 0)
+    return (mask > 127).astype(np.uint8)
+
+MASKS = {'threshold': mask_threshold, 'otsu': mask_otsu}
+
+def make_masks(images, n, method='otsu'):
+    get_mask = MASKS[method]
+    return [get_mask(cv2.resize(img, (n, n))) for img in images]
+
+def build_stages(n, mode='mesh', mask='otsu', sparse=False, smoothing=True, budget=None,
+                 mesh_workers=None, cameras=None, bounds=None):
+    """重建流水线的各个阶段 [(阶段名, 函数)]，第一个阶段接收 BGR 图片列表
+
+    mode='mesh' 结果为 (verts, faces)，坐标在 [0,1]；mode='points' 结果为占据体素坐标 / n。
+    sparse 使用分层稀疏雕刻；budget 为网格三角形上限；mesh_workers 为分块网格的进程数。
+    给出 cameras（各图片的 (K, R, t)）和 bounds 时改用标定多视图雕刻，图片数量任意，
+    mask 保持原图分辨率以便与内参对应，不支持 sparse。
+    """
+    spacing = (1.0/n, 1.0/n, 1.0/n)
+    if cameras is not None:
+        stages = [('抠图', lambda images: [MASKS[mask](img) for img in images])]
+        stages.append(('雕刻', lambda masks: carve_views(masks, cameras, n, bounds)))
+        sparse = False
+    else:
+        stages = [('抠图', lambda images: make_masks(images, n, mask))]
+    if sparse:
+        # 由粗到细雕刻，只有跨越表面的块保存体素
+        stages.append(('雕刻', carve_sparse))
+        if smoothing:
+            # 只在表面附近的带状区域平滑
+            stages.append(('平滑', smooth_sparse))
+        if mode == 'mesh':
+            stages.append(('生成网格', lambda hull: marching_cubes_sparse(hull, spacing=spacing, workers=mesh_workers)))
+        else:
+            stages.append(('取点', lambda hull: hull.points() / n))
+    elif smoothing or mode == 'mesh' or cameras is not None:
+        if cameras is None:
+            # 六个面一次广播雕刻
+            stages.append(('雕刻', carve))
+        if smoothing:
+            # 三维形态学平滑：3x3x3 闭运算再开运算，在按位打包的数据上分离计算
+            stages.append(('平滑', smooth))
+        if mode == 'mesh':
+            # 分块 marching cubes，只处理含表面的块
+            stages.append(('生成网格', lambda voxel: marching_cubes_chunked(voxel, spacing=spacing, workers=mesh_workers)))
+        else:
+            stages.append(('取点', lambda voxel: occupied(voxel) / n))
+    else:
+        # 不平滑时直接按位打包雕刻，只占 N^3/8 字节
+        stages.append(('雕刻', lambda masks: carve(masks, packed=True)))
+        stages.append(('取点', lambda voxel: occupied(voxel, n, packed=True) / n))
+    if mode == 'mesh' and budget:
+        # 简化到三角形预算内
+        stages.append(('简化网格', lambda mesh: decimate(mesh[0], mesh[1], budget)))
+    return stages
+
+def count_stage(metrics, name, data):
+    """按阶段结果累加计数：图片数、占据体素数、点数、三角形数；未开启统计时什么也不做"""
+    if not metrics.enabled:
+        return
+    if name == '抠图':
+        metrics.count('图片', len(data))
+    elif name in ('雕刻', '平滑'):
+        if isinstance(data, SparseHull):
+            voxels = data.count()
+        else:
+            voxels = count_occupied(data, packed=data.dtype == np.uint8)
+        metrics.count(name + '体素', voxels)
+    elif name == '取点':
+        metrics.count('点', len(data))
+    elif name in ('生成网格', '简化网格'):
+        metrics.count(name + '三角形', len(data[1]))
+
+def run_stages(stages, data, metrics=None):
+    """依次执行各阶段，返回 (结果, [(阶段名, 秒)])；给出 metrics 时同时记入计时和计数"""
+    if metrics is None:
+        metrics = Metrics(enabled=False)
+    timings = []
+    for name, fn in stages:
+        t0 = time.perf_counter()
+        with metrics.stage(name):
+            data = fn(data)
+        timings.append((name, time.perf_counter() - t0))
+        count_stage(metrics, name, data)
+    return data, timings
+
+def find_images(folder):
+    """一组照片的六个文件路径，按 FACE_NAMES 顺序；缺面时返回 None"""
+    by_face = {}
+    for fname in os.listdir(folder):
+        stem, ext = os.path.splitext(fname)
+        if ext.lower() in ALLOWED_EXTS and stem.lower() in FACE_NAMES:
+            by_face[stem.lower()] = os.path.join(folder, fname)
+    if len(by_face) != len(FACE_NAMES):
+        return None
+    return [by_face[f] for f in FACE_NAMES]
+
+def load_views(folder):
+    """读取 cameras.json，返回 (图片路径列表, [(K, R, t)], bounds)；没有该文件时返回 None"""
+    path = os.path.join(folder, CAMERAS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        calib = json.load(f)
+    paths, cameras = [], []
+    for v in calib['views']:
+        paths.append(os.path.join(folder, v['image']))
+        cameras.append((np.asarray(v['K'], dtype=np.float64),
+                        np.asarray(v['R'], dtype=np.float64),
+                        np.asarray(v['t'], dtype=np.float64)))
+    return paths, cameras, calib['bounds']
+
+def is_set(folder):
+    return os.path.exists(os.path.join(folder, CAMERAS_FILE)) or find_images(folder) is not None
+
+def find_sets(paths):
+    """命令行给出的目录展开为照片组目录列表"""
+    sets = []
+    for p in paths:
+        if is_set(p):
+            sets.append(p)
+            continue
+        for sub in sorted(os.listdir(p)):
+            d = os.path.join(p, sub)
+            if os.path.isdir(d) and is_set(d):
+                sets.append(d)
+    return sets
+
+def process_set(folder, out_dir, n=96, mode='mesh', mask='otsu', sparse=False,
+                smoothing=True, budget=None, fmt='ply', mesh_workers=1):
+    """处理一组照片并写出结果，在进程池中执行，返回本组的统计信息"""
+    t0 = time.perf_counter()
+    views = load_views(folder)
+    cameras = bounds = None
+    if views is not None:
+        paths, cameras, bounds = views
+    else:
+        paths = find_images(folder)
+        if paths is None:
+            raise ValueError(f"{folder} 中缺少 {'/'.join(FACE_NAMES)} 六张图片")
+    images = []
+    for p in paths:
+        img = cv2.imread(p, cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"无法读取图片 {p}")
+        images.append(img)
+    t_load = time.perf_counter() - t0
+    stages = build_stages(n, mode, mask, sparse, smoothing, budget, mesh_workers=mesh_workers,
+                          cameras=cameras, bounds=bounds)
+    result, timings = run_stages(stages, images)
+
+    t1 = time.perf_counter()
+    name = os.path.basename(os.path.normpath(folder))
+    if mode == 'mesh':
+        verts, faces = result
+        out_path = os.path.join(out_dir, name + '.ply')
+        write_mesh(out_path, verts - 0.5, faces)  # 居中
+        count = len(faces)
+    else:
+        out_path = os.path.join(out_dir, f'{name}.{fmt}')
+        write_points(out_path, result, fmt)
+        count = len(result)
+    timings = [('读图', t_load)] + timings + [('导出', time.perf_counter() - t1)]
+    return {'set': folder, 'output': out_path, 'count': count,
+            'seconds': time.perf_counter() - t0, 'stages': timings}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量六面体素重建，不需要图形界面")
+    parser.add_argument('paths', nargs='+', help="照片组目录，或包含多个照片组子目录的目录")
+    parser.add_argument('-o', '--output', default='recon_output', help="输出目录")
+    parser.add_argument('--mode', choices=('mesh', 'points'), default='mesh', help="导出三角网格(ply)或体素点云")
+    parser.add_argument('--n', type=int, default=96, help="体素分辨率")
+    parser.add_argument('--mask', choices=sorted(MASKS), default='otsu', help="抠图方法")
+    parser.add_argument('--sparse', action='store_true', help="分层稀疏雕刻，高分辨率时省内存")
+    parser.add_argument('--no-smooth', action='store_true', help="跳过三维形态学平滑")
+    parser.add_argument('--budget', type=int, help="网格三角形上限，超出时简化")
+    parser.add_argument('--format', choices=FORMATS, default='ply', help="点云导出格式")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="并行处理的进程数")
+    args = parser.parse_args(argv)
+
+    sets = find_sets(args.paths)
+    if not sets:
+        print("没有找到包含六张照片或 cameras.json 的目录。")
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+    options = dict(n=args.n, mode=args.mode, mask=args.mask, sparse=args.sparse,
+                   smoothing=not args.no_smooth, budget=args.budget, fmt=args.format,
+                   # 各组已经分到不同进程，组数少于进程数时多出的核留给分块网格
+                   mesh_workers=max(1, args.workers // len(sets)))
+    unit = '三角形' if args.mode == 'mesh' else '点'
+    print(f"共 {len(sets)} 组，{args.workers} 个进程，N={args.n}")
+
+    t0 = time.perf_counter()
+    done, failed, busy = 0, 0, 0.0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(process_set, s, args.output, **options): s for s in sets}
+        for fut in as_completed(futures):
+            try:
+                r = fut.result()
+            except Exception as e:
+                failed += 1
+                print(f"[失败] {futures[fut]}: {e}")
+                continue
+            done += 1
+            busy += r['seconds']
+            stages = ' '.join(f'{name} {sec:.3f}s' for name, sec in r['stages'])
+            print(f"[{done + failed}/{len(sets)}] {r['set']} -> {r['output']} "
+                  f"{r['count']} {unit}，{r['seconds']:.3f}s（{stages}）")
+    wall = time.perf_counter() - t0
+    print(f"完成 {done} 组，失败 {failed} 组，总耗时 {wall:.2f}s，"
+          f"吞吐 {done / wall:.2f} 组/秒，单组平均 {busy / max(done, 1):.3f}s，"
+          f"并行加速 {busy / wall:.2f}x")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,142 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from blobstore import CHUNK_SIZE
+
+class OffsetMismatch(Exception):
+    """客户端给出的偏移与服务端已收到的字节数不一致"""
+    def __init__(self, offset):
+        super().__init__(f'当前偏移为 {offset}')
+        self.offset = offset
+
+class ResumableUploads:
+    """可断点续传的分块上传会话，保存在 <folder>/.partial 下，服务器重启后仍可继续
+
+    每个会话为 <id>.json（文件名、总大小、可选的预期哈希、创建时间）和 <id>.part（已收到的数据）。
+    已收到的字节数就是 .part 的文件大小，客户端按服务端返回的偏移续传，不会重复发送。
+    收齐后由 blob_store.put_file 改名移入 blob 存储，不再复制。
+    """
+    def __init__(self, folder, blob_store, ttl=24 * 3600):
+        self.dir = os.path.join(folder, '.partial')
+        self.blob_store = blob_store
+        self.ttl = ttl
+        os.makedirs(self.dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def _paths(self, upload_id):
+        base = os.path.join(self.dir, upload_id)
+        return base + '.json', base + '.part'
+
+    def _session_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def create(self, name, size, digest=None):
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        meta_path, part_path = self._paths(upload_id)
+        meta = {'name': name, 'size': size, 'hash': digest, 'created': time.time()}
+        open(part_path, 'wb').close()
+        tmp = meta_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, meta_path)
+        return upload_id
+
+    def get(self, upload_id):
+        """会话信息 {id, name, size, hash, offset}，不存在时返回 None"""
+        if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+            return None
+        meta_path, part_path = self._paths(upload_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            offset = os.path.getsize(part_path)
+        except (OSError, ValueError):
+            return None
+        return dict(meta, id=upload_id, offset=offset)
+
+    def append(self, upload_id, offset, stream):
+        """从 offset 处写入 stream 的内容，返回新的偏移
+
+        offset 与已收到的字节数不同时抛出 OffsetMismatch；超出声明的总大小时抛出 ValueError，本块不写入。
+        同一会话的写入互斥，不同会话可以并行。
+        """
+        with self._session_lock(upload_id):
+            info = self.get(upload_id)
+            if info is None:
+                raise KeyError(upload_id)
+            if offset != info['offset']:
+                raise OffsetMismatch(info['offset'])
+            _, part_path = self._paths(upload_id)
+            received = offset
+            with open(part_path, 'ab') as f:
+                try:
+                    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                        received += len(chunk)
+                        if received > info['size']:
+                            raise ValueError(f"超出声明的大小 {info['size']} 字节")
+                        f.write(chunk)
+                except ValueError:
+                    # 超出大小的块整块作废；连接中断时已写入的部分保留，客户端查询偏移后接着发
+                    f.flush()
+                    f.truncate(offset)
+                    raise
+            return received
+
+    def finish(self, upload_id):
+        """收齐的会话移入 blob 存储并删除，返回 (digest, 是否新内容)
+
+        创建时给了预期哈希而内容不符时抛出 ValueError，会话作废。
+        """
+        with self._session_lock(upload_id):
+            info = self.get(upload_id)
+            if info is None:
+                raise KeyError(upload_id)
+            _, part_path = self._paths(upload_id)
+            try:
+                digest, new = self.blob_store.put_file(part_path, expected=info['hash'])
+            finally:
+                self._remove(upload_id)
+        return digest, new
+
+    def _remove(self, upload_id):
+        for p in self._paths(upload_id):
+            if os.path.exists(p):
+                os.remove(p)
+        with self._lock:
+            self._locks.pop(upload_id, None)
+
+    def abort(self, upload_id):
+        with self._session_lock(upload_id):
+            self._remove(upload_id)
+
+    def expire(self):
+        """删除超过 ttl 没有更新的会话"""
+        cutoff = time.time() - self.ttl
+        for fname in os.listdir(self.dir):
+            upload_id, ext = os.path.splitext(fname)
+            if ext != '.part':
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.dir, fname)) < cutoff:
+                    self.abort(upload_id)
+            except OSError:
+                pass
+
+    def clear(self):
+        """删除所有会话；逐个持有会话锁，不会删掉正在追加或入库的文件"""
+        for fname in os.listdir(self.dir):
+            upload_id, ext = os.path.splitext(fname)
+            if ext in ('.json', '.part'):
+                self.abort(upload_id)
+            else:
+                try:
+                    os.remove(os.path.join(self.dir, fname))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,84 @@
+"""web.py 的生产运行方式，代替 app.run(debug=True) 的开发服务器
+
+    python serve.py --port 5001 --threads 32
+
+按顺序选用已安装的服务器（也可用 --server 指定）：
+
+- gunicorn：gthread 工作线程，持久连接，下载用 sendfile 零拷贝（不支持 Windows）
+- waitress：纯 Python 多线程，Windows 也能用，请求体先由服务器缓存
+- werkzeug：都没装时退回每个连接一个线程的内置服务器，关闭调试和自动重载
+
+上传在 web.py 里边收边解析、分块写盘，不经过 request.files，单个文件和单次请求都有大小上限。
+只开一个进程：上传索引和重建任务状态保存在进程内存里，并发由线程提供。
+每个等待中的长轮询（/api/changes，最长 10 秒）和 SSE 连接（/api/events，最长 5 分钟后重连）
+都占住一个工作线程，同时最多 WEB_MAX_SUBSCRIBERS（默认 4）个，超出返回 503；
+有很多 app.py --follow 客户端时要相应加大 --threads，给上传和下载留出线程。
+"""
+import argparse
+import logging
+import os
+
+SERVERS = ('gunicorn', 'waitress', 'werkzeug')
+
+def serve_gunicorn(host, port, threads, timeout):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{host}:{port}')
+            self.cfg.set('workers', 1)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', threads)
+            self.cfg.set('timeout', timeout)
+            self.cfg.set('keepalive', 5)
+            self.cfg.set('sendfile', True)
+
+        def load(self):
+            from web import app
+            return app
+
+    Server().run()
+
+def serve_waitress(host, port, threads, timeout):
+    import waitress
+    from web import app, MAX_REQUEST_SIZE
+    waitress.serve(app, host=host, port=port, threads=threads, channel_timeout=timeout,
+                   max_request_body_size=MAX_REQUEST_SIZE)
+
+def serve_werkzeug(host, port, threads, timeout):
+    from werkzeug.serving import make_server
+    from web import app
+    server = make_server(host, port, app, threaded=True)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    print(f'werkzeug 多线程服务器运行于 http://{host}:{port}')
+    server.serve_forever()
+
+def available(name):
+    if name == 'werkzeug':
+        return True
+    if name == 'gunicorn' and os.name == 'nt':
+        return False
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以多线程生产模式运行上传服务器 web.py")
+    parser.add_argument('--host', default='0.0.0.0', help="监听地址")
+    parser.add_argument('--port', type=int, default=5001, help="监听端口")
+    parser.add_argument('--threads', type=int, default=16, help="工作线程数")
+    parser.add_argument('--timeout', type=int, default=120, help="单个请求超时秒数，大文件上传要留够时间")
+    parser.add_argument('--server', choices=('auto',) + SERVERS, default='auto',
+                        help="auto 时按 gunicorn、waitress、werkzeug 顺序选第一个已安装的")
+    args = parser.parse_args(argv)
+    if args.server == 'auto':
+        args.server = next(s for s in SERVERS if available(s))
+    elif not available(args.server):
+        parser.error(f"没有安装 {args.server}")
+    globals()['serve_' + args.server](args.host, args.port, args.threads, args.timeout)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
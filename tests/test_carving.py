@@ -0,0 +1,111 @@
+"""雕刻、平滑、网格各实现与参考实现（原逐切片循环、scipy、整体 skimage）逐体素/逐三角形一致"""
+import numpy as np
+import pytest
+from scipy import ndimage
+from skimage.measure import marching_cubes
+
+import meshing
+from carving import carve, carve_sparse, occupied, unpack
+from meshing import marching_cubes_chunked, marching_cubes_sparse, weld
+from morphology import smooth, smooth_sparse
+
+SIZES = (13, 40, 64)
+
+def reference_carve(masks):
+    """原来 3d_reconstruct.py 的逐切片写法"""
+    n = len(masks[0])
+    masks = [np.asarray(m).astype(bool) for m in masks]
+    voxel = np.ones((n, n, n), dtype=bool)
+    for z in range(n):
+        voxel[:, :, z] &= masks[0][:, z]
+        voxel[:, :, z] &= masks[1][:, n-1-z]
+    for x in range(n):
+        voxel[x, :, :] &= masks[2][:, x][:, None]
+        voxel[x, :, :] &= masks[3][:, n-1-x][:, None]
+    for y in range(n):
+        voxel[:, y, :] &= masks[4][y, :]
+        voxel[:, y, :] &= masks[5][n-1-y, :]
+    return voxel
+
+def make_masks(n, seed):
+    """六张 0/1 mask：偏心的圆盘（越过网格边界）加随机噪声，有的面整张为 1"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[:n, :n]
+    masks = []
+    for i in range(6):
+        cy, cx = rng.uniform(0.3, 0.7, 2) * n
+        r = rng.uniform(0.45, 0.7) * n
+        m = (yy - cy) ** 2 + (xx - cx) ** 2 < r * r
+        m ^= rng.random((n, n)) < 0.03
+        if i == seed % 6:
+            m[:] = True
+        masks.append(m.astype(np.uint8))
+    return masks
+
+def canonical_mesh(verts, faces):
+    """每个三角形的三个顶点坐标，旋转到最小的顶点在前（保持朝向），排序后比较"""
+    rolled = []
+    for t in verts[faces]:
+        i = min(range(3), key=lambda k: tuple(t[k]))
+        rolled.append(np.roll(t, -i, axis=0).ravel())
+    rolled = np.array(rolled).reshape(-1, 9)
+    return rolled[np.lexsort(rolled.T[::-1])]
+
+def reference_mesh(voxel):
+    v, f, _, _ = marching_cubes(voxel, level=0.5)
+    return canonical_mesh(*weld(v, f))
+
+@pytest.mark.parametrize('n', SIZES)
+@pytest.mark.parametrize('seed', range(3))
+def test_carve_matches_slice_loop(n, seed):
+    masks = make_masks(n, seed)
+    ref = reference_carve(masks)
+    np.testing.assert_array_equal(carve(masks), ref)
+    packed = carve(masks, packed=True)
+    np.testing.assert_array_equal(unpack(packed, n), ref)
+    np.testing.assert_array_equal(occupied(packed, n, packed=True), np.argwhere(ref))
+
+@pytest.mark.parametrize('n', SIZES)
+@pytest.mark.parametrize('seed', range(3))
+def test_carve_sparse_matches_dense(n, seed):
+    masks = make_masks(n, seed)
+    ref = reference_carve(masks)
+    hull = carve_sparse(masks)
+    np.testing.assert_array_equal(hull.to_dense(), ref)
+    np.testing.assert_array_equal(hull.points(), np.argwhere(ref))
+    assert hull.count() == np.count_nonzero(ref)
+
+@pytest.mark.parametrize('n', SIZES)
+@pytest.mark.parametrize('radius', (1, 2))
+def test_smooth_matches_scipy(n, radius):
+    voxel = reference_carve(make_masks(n, radius))
+    cube = np.ones((2 * radius + 1,) * 3)
+    ref = ndimage.binary_opening(ndimage.binary_closing(voxel, structure=cube), structure=cube)
+    np.testing.assert_array_equal(smooth(voxel, radius), ref)
+
+@pytest.mark.parametrize('n', SIZES)
+def test_smooth_sparse_matches_dense(n):
+    masks = make_masks(n, 1)
+    ref = smooth(reference_carve(masks))
+    np.testing.assert_array_equal(smooth_sparse(carve_sparse(masks)).to_dense(), ref)
+
+@pytest.mark.parametrize('n', SIZES)
+@pytest.mark.parametrize('chunk', (8, 32))
+def test_marching_cubes_chunked_matches_skimage(n, chunk):
+    voxel = reference_carve(make_masks(n, 2))
+    v, f = marching_cubes_chunked(voxel, chunk=chunk, workers=1)
+    np.testing.assert_array_equal(canonical_mesh(v, f), reference_mesh(voxel))
+
+def test_marching_cubes_chunked_pool_matches_serial(monkeypatch):
+    monkeypatch.setattr(meshing, 'POOL_MIN_VOXELS', 0)
+    voxel = reference_carve(make_masks(40, 0))
+    serial = marching_cubes_chunked(voxel, chunk=8, workers=1)
+    pooled = marching_cubes_chunked(voxel, chunk=8, workers=2)
+    np.testing.assert_array_equal(pooled[0], serial[0])
+    np.testing.assert_array_equal(pooled[1], serial[1])
+
+@pytest.mark.parametrize('n', SIZES)
+def test_marching_cubes_sparse_matches_skimage(n):
+    masks = make_masks(n, 0)
+    v, f = marching_cubes_sparse(carve_sparse(masks), chunk_cells=2, workers=1)
+    np.testing.assert_array_equal(canonical_mesh(v, f), reference_mesh(reference_carve(masks)))
@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import time
+
+from blobstore import sha256_file
+
+SORT_KEYS = ('name', 'mtime', 'size')
+LOG_NAME = '.index.log'
+
+class UploadIndex:
+    """上传目录的内存元数据索引：文件名 -> {name, size, mtime, hash}
+
+    启动时扫描一次，上传/清空时由调用方增量更新。
+    每次访问只 stat 目录本身，目录被外部改动（mtime 变化）时才重新扫描。
+    内容哈希在第一次需要时计算并缓存。
+
+    上传的文件名是 blob 的硬链接，同内容的文件共用一个 inode 和 mtime，
+    所以上传时间和哈希不取自文件，而是追加记录到 <folder>/.index.log；
+    重建时 inode 和大小都对得上的记录直接沿用，重启后不必重新计算哈希。
+    以 . 开头的文件不算上传文件。
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._reserved = set()
+        self._next_suffix = {}
+        self._dir_mtime = None
+        self._scans = []  # 进行中的 rebuild() 各自的 pending 记录
+        self._log_path = os.path.join(folder, LOG_NAME)
+        self._log_records = 0
+        self.rebuild()
+
+    def _read_log(self):
+        """{文件名: 最后一条记录}；中断写入留下的半行忽略"""
+        records = {}
+        count = 0
+        try:
+            with open(self._log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    records[rec['name']] = rec
+                    count += 1
+        except OSError:
+            pass
+        return records, count
+
+    def _append_log(self, rec):
+        with open(self._log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+        self._log_records += 1
+
+    def _compact_log(self, inodes):
+        """只保留当前文件的记录，先写临时文件再替换"""
+        tmp = self._log_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for name, e in self._entries.items():
+                ino = inodes.get(name)
+                if ino is None:
+                    ino = os.stat(os.path.join(self.folder, name)).st_ino
+                f.write(json.dumps({'name': name, 'hash': e['hash'], 'mtime': e['mtime'],
+                                    'size': e['size'], 'ino': ino}, ensure_ascii=False) + '\n')
+        os.replace(tmp, self._log_path)
+        self._log_records = len(self._entries)
+
+    def rebuild(self):
+        """扫描目录重建索引
+
+        扫描在锁外进行；期间的 add()/clear() 同时记到本次扫描的 pending 里，
+        合并时以它们为准，不会被扫描开始前的目录状态覆盖。
+        """
+        pending = {'entries': {}, 'cleared': False}
+        with self._lock:
+            self._scans.append(pending)
+        try:
+            # 先取目录 mtime 再扫描，扫描期间的外部改动在下次检查时仍会触发重扫
+            dir_mtime = os.stat(self.folder).st_mtime_ns
+            records, count = self._read_log()
+            entries = {}
+            inodes = {}
+            with os.scandir(self.folder) as it:
+                for e in it:
+                    if e.is_file() and not e.name.startswith('.'):
+                        st = e.stat()
+                        entry = {'name': e.name, 'size': st.st_size, 'mtime': st.st_mtime, 'hash': None}
+                        rec = records.get(e.name)
+                        if rec and rec.get('ino') == st.st_ino and rec.get('size') == st.st_size:
+                            entry['mtime'] = rec['mtime']
+                            entry['hash'] = rec['hash']
+                        entries[e.name] = entry
+                        inodes[e.name] = st.st_ino
+        except BaseException:
+            with self._lock:
+                self._scans.remove(pending)
+            raise
+        with self._lock:
+            self._scans.remove(pending)
+            if pending['cleared']:
+                entries = {}
+            # 内容没变的文件保留已算好的哈希
+            for name, entry in entries.items():
+                old = self._entries.get(name)
+                if entry['hash'] is None and old and old['size'] == entry['size'] and old['mtime'] == entry['mtime']:
+                    entry['hash'] = old['hash']
+            entries.update(pending['entries'])
+            self._entries = entries
+            self._dir_mtime = dir_mtime
+            self._log_records = max(self._log_records, count)
+            if self._log_records > 2 * len(entries) + 100:
+                self._compact_log(inodes)
+
+    def _check_fresh(self):
+        if os.stat(self.folder).st_mtime_ns != self._dir_mtime:
+            self.rebuild()
+
+    def allocate(self, filename):
+        """为 filename 分配一个未被占用的名字并预留，重名时依次加 _1、_2 … 后缀
+
+        每个原始文件名记住下一个可用编号，摊还 O(1)，不再逐个试探磁盘。
+        预留的名字在 add() 或 release() 后解除。
+        """
+        self._check_fresh()
+        base, ext = os.path.splitext(filename)
+        with self._lock:
+            name = filename
+            i = self._next_suffix.get(filename, 1)
+            while name in self._entries or name in self._reserved:
+                name = f"{base}_{i}{ext}"
+                i += 1
+            if name != filename:
+                self._next_suffix[filename] = i
+            self._reserved.add(name)
+        return name
+
+    def release(self, name):
+        with self._lock:
+            self._reserved.discard(name)
+
+    def add(self, name, digest=None):
+        """登记刚写好的文件，mtime 记为当前时间（上传时间）"""
+        st = os.stat(os.path.join(self.folder, name))
+        entry = {'name': name, 'size': st.st_size, 'mtime': time.time(), 'hash': digest}
+        with self._lock:
+            self._append_log(dict(entry, ino=st.st_ino))
+            self._entries[name] = entry
+            for p in self._scans:
+                p['entries'][name] = entry
+            self._reserved.discard(name)
+            self._dir_mtime = os.stat(self.folder).st_mtime_ns
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._next_suffix = {}
+            for p in self._scans:
+                p['entries'] = {}
+                p['cleared'] = True
+            if os.path.exists(self._log_path):
+                os.remove(self._log_path)
+            self._log_records = 0
+            self._dir_mtime = os.stat(self.folder).st_mtime_ns
+
+    def __contains__(self, name):
+        self._check_fresh()
+        return name in self._entries
+
+    def __len__(self):
+        self._check_fresh()
+        return len(self._entries)
+
+    def usage(self):
+        """(文件数, 按文件名累计的字节数)，重复内容按各自的文件名分别计算"""
+        self._check_fresh()
+        with self._lock:
+            return len(self._entries), sum(e['size'] for e in self._entries.values())
+
+    def get(self, name, with_hash=False):
+        self._check_fresh()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            if not with_hash or entry['hash'] is not None:
+                return dict(entry)
+        # 哈希在锁外计算，写回时确认条目没有被替换
+        path = os.path.join(self.folder, name)
+        digest = sha256_file(path)
+        ino = os.stat(path).st_ino
+        with self._lock:
+            if self._entries.get(name) is entry:
+                entry['hash'] = digest
+                self._append_log(dict(entry, ino=ino))
+            return dict(entry, hash=digest)
+
+    def list(self, sort='name', reverse=False, since=None, offset=0, limit=None, with_hash=False):
+        """按 sort 排序并分页，since 只返回 mtime 晚于该时间戳的文件
+
+        返回 (本页条目列表, 过滤后总数)。
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort 只能是 {', '.join(SORT_KEYS)}")
+        self._check_fresh()
+        with self._lock:
+            entries = list(self._entries.values())
+        if since is not None:
+            entries = [e for e in entries if e['mtime'] > since]
+        entries.sort(key=lambda e: (e[sort], e['name']), reverse=reverse)
+        total = len(entries)
+        page = entries[offset:offset + limit if limit is not None else None]
+        if with_hash:
+            return [self.get(e['name'], with_hash=True) or e for e in page], total
+        return [dict(e) for e in page], total
@@ -0,0 +1,100 @@
+import zlib
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from blobstore import CHUNK_SIZE
+
+# Content-Encoding -> zlib wbits
+ENCODINGS = {'gzip': 31, 'x-gzip': 31, 'deflate': 15}
+
+class InflateStream:
+    """边读边解压的请求体，用于客户端压缩上传（Content-Encoding: gzip/deflate）
+
+    解压后的总字节数超过 limit 时抛出 RequestEntityTooLarge，防止压缩炸弹。
+    格式错误时抛出 ValueError。
+    """
+    def __init__(self, stream, encoding, limit=None, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.limit = limit
+        self.chunk_size = chunk_size
+        self.total = 0
+        self._z = zlib.decompressobj(ENCODINGS[encoding])
+        self._buf = b''
+        self._eof = False
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self.chunk_size
+        while len(self._buf) < n and not self._eof:
+            # max_length 限制单次输出，高压缩比的数据也不会一次解出很大的块
+            data = self._z.unconsumed_tail or self.stream.read(self.chunk_size)
+            try:
+                if data:
+                    out = self._z.decompress(data, n)
+                else:
+                    out = self._z.flush()
+                    self._eof = True
+            except zlib.error as e:
+                raise ValueError(f'压缩数据无效: {e}') from None
+            if self._z.eof:
+                self._eof = True
+            self.total += len(out)
+            if self.limit is not None and self.total > self.limit:
+                raise RequestEntityTooLarge('解压后超过请求大小上限')
+            self._buf += out
+        out, self._buf = self._buf[:n], self._buf[n:]
+        return out
+
+def receive_files(stream, boundary, blob_store, accept, max_file_size=None, chunk_size=CHUNK_SIZE):
+    """边读请求体边解析 multipart/form-data，把文件部分直接写进 blob_store
+
+    不经过 request.files，整个请求不在内存或临时文件里缓存，文件内容只写一次磁盘。
+    每个带文件名的文件部分结束时 yield (文件名, digest, 字节数, 错误)：
+    accept(字段名, 文件名) 为假时错误为 'rejected'，超过 max_file_size 时为 'too_large'，
+    这两种情况 digest 为 None、内容读过即丢；普通字段直接忽略。
+    """
+    # 普通字段的内容读过即丢，解码器的缓冲区只随每次送入的块大小增长，不再另设内存上限
+    decoder = MultipartDecoder(boundary)
+    writer = None
+    filename = None
+    error = None
+    size = 0
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, File):
+                    filename = event.filename
+                    size = 0
+                    error = None
+                    if filename and accept(event.name, filename):
+                        writer = blob_store.writer()
+                    else:
+                        error = 'rejected'
+                elif isinstance(event, Field):
+                    filename = None
+                elif isinstance(event, Data) and filename:
+                    size += len(event.data)
+                    if writer is not None:
+                        if max_file_size is not None and size > max_file_size:
+                            writer.abort()
+                            writer = None
+                            error = 'too_large'
+                        else:
+                            writer.write(event.data)
+                    if not event.more_data:
+                        digest = None
+                        if writer is not None:
+                            w, writer = writer, None
+                            digest, _ = w.commit()
+                        yield filename, digest, size, error
+                        filename = None
+                event = decoder.next_event()
+            if not chunk or isinstance(event, Epilogue):
+                break
+    finally:
+        if writer is not None:
+            writer.abort()
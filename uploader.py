@@ -0,0 +1,159 @@
+"""采集设备的上传客户端：小图片合并成批量请求，大文件分块续传
+
+    python uploader.py --server http://127.0.0.1:5001 imgs/*.jpg
+    python uploader.py --gzip --chunk-mb 2 scan.bmp
+
+小于 --resumable-mb 的文件每 --batch 个合成一个 POST /api/upload，按文件返回结果；
+更大的文件走 /api/resumable，每块带 Upload-Offset，失败后按服务端记录的偏移接着发。
+会话 id 记在 --state 文件里，进程重启后同一文件从断点继续。
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+
+import requests
+from urllib3 import encode_multipart_formdata
+
+from blobstore import sha256_file
+from downloader import make_session
+
+def post_body(session, url, body, headers, compress=False, timeout=300):
+    if compress:
+        body = gzip.compress(body, compresslevel=6)
+        headers = dict(headers, **{'Content-Encoding': 'gzip'})
+    resp = session.post(url, data=body, headers=headers, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()
+
+def upload_batch(session, server, paths, compress=False, timeout=300):
+    """一个请求上传多个文件，返回服务端逐个文件的结果列表"""
+    fields = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            fields.append(('photos', (os.path.basename(path), f.read())))
+    body, content_type = encode_multipart_formdata(fields)
+    return post_body(session, server + '/api/upload', body, {'Content-Type': content_type},
+                     compress, timeout)['files']
+
+def upload_resumable(session, server, path, state=None, chunk_size=4 * 1024 * 1024,
+                     compress=False, retries=5, timeout=60):
+    """分块上传一个文件，返回服务端结果；state 为 {键: 会话 url}，记录未完成的会话以便下次继续
+
+    创建会话时带上 sha256，服务端收齐后校验内容。
+    每块失败后查询服务端偏移再续传，连续失败 retries 次后抛出异常。
+    """
+    state = {} if state is None else state
+    size = os.path.getsize(path)
+    digest = sha256_file(path)
+    key = f'{os.path.abspath(path)}:{digest}'
+    url = state.get(key)
+    offset = None
+    if url:
+        resp = session.get(server + url, timeout=timeout)
+        if resp.ok:
+            offset = resp.json()['offset']
+    if offset is None:
+        resp = session.post(server + '/api/resumable', timeout=timeout,
+                            json={'name': os.path.basename(path), 'size': size, 'hash': digest})
+        resp.raise_for_status()
+        data = resp.json()
+        if data['complete']:
+            state.pop(key, None)
+            return data
+        url, offset = data['url'], data['offset']
+        state[key] = url
+
+    failures = 0
+    with open(path, 'rb') as f:
+        while True:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            headers = {'Upload-Offset': str(offset), 'Content-Type': 'application/offset+octet-stream'}
+            if compress:
+                chunk = gzip.compress(chunk, compresslevel=6)
+                headers['Content-Encoding'] = 'gzip'
+            try:
+                resp = session.patch(server + url, data=chunk, headers=headers, timeout=timeout)
+                if resp.status_code == 409:
+                    # 上一块其实已经收到（或只收到一部分），按服务端偏移继续
+                    offset = resp.json()['offset']
+                    continue
+                resp.raise_for_status()
+            except requests.RequestException:
+                failures += 1
+                if failures > retries:
+                    raise
+                time.sleep(min(0.5 * 2 ** failures, 30))
+                try:
+                    resp = session.get(server + url, timeout=timeout)
+                    resp.raise_for_status()
+                    offset = resp.json()['offset']
+                except requests.RequestException:
+                    pass
+                continue
+            failures = 0
+            data = resp.json()
+            if data['complete']:
+                state.pop(key, None)
+                return data
+            offset = data['offset']
+
+def load_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(path, state):
+    if not state:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量/续传上传图片到 web.py")
+    parser.add_argument('files', nargs='+', help="要上传的图片")
+    parser.add_argument('--server', default="http://127.0.0.1:5001", help="web.py 服务地址")
+    parser.add_argument('--batch', type=int, default=32, help="每个批量请求的文件数")
+    parser.add_argument('--resumable-mb', type=float, default=8, help="不小于此大小(MB)的文件分块续传")
+    parser.add_argument('--chunk-mb', type=float, default=4, help="续传的分块大小(MB)")
+    parser.add_argument('--gzip', action='store_true', help="gzip 压缩请求体，适合 PNG/BMP，JPEG 基本压不动")
+    parser.add_argument('--retries', type=int, default=5, help="续传单块连续失败的重试次数")
+    parser.add_argument('--state', default='.upload_state.json', help="未完成续传会话的记录文件")
+    args = parser.parse_args(argv)
+
+    session = make_session()
+    threshold = args.resumable_mb * 1024 * 1024
+    small = [p for p in args.files if os.path.getsize(p) < threshold]
+    large = [p for p in args.files if os.path.getsize(p) >= threshold]
+    counts = {}
+
+    def report(path, r):
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+        print(f"{r['status']:<10} {path}" + (f" -> {r['name']}" if r.get('name') else ''))
+
+    for i in range(0, len(small), args.batch):
+        paths = small[i:i + args.batch]
+        for path, r in zip(paths, upload_batch(session, args.server, paths, compress=args.gzip)):
+            report(path, r)
+
+    state = load_state(args.state)
+    try:
+        for path in large:
+            r = upload_resumable(session, args.server, path, state, chunk_size=int(args.chunk_mb * 1024 * 1024),
+                                 compress=args.gzip, retries=args.retries)
+            report(path, r)
+    finally:
+        save_state(args.state, state)
+    print('，'.join(f"{k} {v}" for k, v in counts.items()))
+    return 0 if set(counts) <= {'saved', 'duplicate'} else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+def variant_tag(max_side=None, scale=None):
+    """缩小参数的规范写法，服务端缓存文件名、ETag 和客户端缓存键都用它"""
+    if max_side:
+        return f'm{int(max_side)}'
+    if scale:
+        return f's{float(scale):g}'
+    return ''
+
+def target_size(w, h, max_side=None, scale=None):
+    if max_side:
+        f = min(1.0, max_side / max(w, h))
+    else:
+        f = min(1.0, scale)
+    return max(1, round(w * f)), max(1, round(h * f))
+
+class VariantCache:
+    """缩小版本图片的磁盘缓存，按内容哈希+缩小参数命名，总大小超限时按 LRU 淘汰"""
+    def __init__(self, folder, max_bytes=512 * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self._total = sum(e.stat().st_size for e in os.scandir(folder) if e.is_file())
+
+    def get(self, src_path, digest, max_side=None, scale=None):
+        """返回 (文件路径, ETag)，不需要缩小时直接返回原图路径"""
+        if max_side is not None and max_side < 1:
+            raise ValueError("max_side 必须大于0")
+        if scale is not None and not 0 < scale <= 1:
+            raise ValueError("scale 必须在 (0, 1] 之间")
+        tag = variant_tag(max_side, scale)
+        etag = f'{digest}-{tag}'
+        ext = os.path.splitext(src_path)[1].lower()
+        path = os.path.join(self.folder, etag + ext)
+        if os.path.exists(path):
+            os.utime(path)
+            return path, etag
+        # 用 imdecode 读，中文文件名在 Windows 上也能打开
+        img = cv2.imdecode(np.fromfile(src_path, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if img is None:
+            raise ValueError("无法解码图片")
+        h, w = img.shape[:2]
+        size = target_size(w, h, max_side, scale)
+        if size == (w, h):
+            return src_path, etag
+        small = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        params = [cv2.IMWRITE_JPEG_QUALITY, 90] if ext in ('.jpg', '.jpeg') else []
+        ok, buf = cv2.imencode(ext, small, params)
+        if not ok:
+            raise ValueError("无法编码图片")
+        fd, tmp_path = tempfile.mkstemp(suffix='.part', dir=self.folder)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(buf.tobytes())
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total += len(buf)
+            if self._total > self.max_bytes:
+                self._evict(keep=path)
+        return path, etag
+
+    def _evict(self, keep):
+        entries = []
+        for e in os.scandir(self.folder):
+            if e.is_file() and not e.name.endswith('.part'):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+        entries.sort()
+        self._total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if self._total <= self.max_bytes:
+                break
+            if p == keep:
+                continue
+            try:
+                os.remove(p)
+            except OSError:
+                continue
+            self._total -= size
@@ -1,12 +1,19 @@
 import sys
-import cv2
-import numpy as np
 from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout
-from PyQt5.QtCore import QTimer, Qt
+from PyQt5.QtCore import QTimer
 from PyQt5.QtGui import QImage, QPixmap
 import open3d as o3d
+from pointcloud_io import write_points
+from reconstruct import build_stages
+from recon_worker import WorkerSlot
+from metrics import Metrics
+from camera import CameraThread
 
 face_names = ['front', 'back', 'left', 'right', 'top', 'bottom']
+VOXEL_N = 128  # 分辨率
+SPARSE_CARVE = False  # 分层稀疏雕刻，开启后分辨率可以到 1024
+METRICS = False  # 每次重建完成后在终端打印各阶段耗时和计数（图片、体素、点、三角形）
+PROFILE = None  # 给出文件名（如 'recon.prof'）时用 cProfile 采样重建线程
 
 class MainWindow(QWidget):
     def __init__(self):
@@ -24,34 +31,47 @@ class MainWindow(QWidget):
         self.btn_voxel = QPushButton("体素重建并可视化")
         self.btn_voxel.setEnabled(False)
         self.btn_voxel.clicked.connect(self.voxel_reconstruct)
+        self.btn_cancel = QPushButton("取消重建")
+        self.btn_cancel.setEnabled(False)
+        self.btn_cancel.clicked.connect(self.cancel_reconstruct)
+        self.status_label = QLabel()
 
         # 布局
         vbox_left = QVBoxLayout()
         vbox_left.addWidget(self.cam_label)
         vbox_left.addWidget(self.btn_capture)
         vbox_left.addWidget(self.btn_voxel)
+        vbox_left.addWidget(self.btn_cancel)
+        vbox_left.addWidget(self.status_label)
         vbox_left.addStretch(1)
         self.setLayout(vbox_left)
 
-        # 摄像头定时器
-        self.cap = cv2.VideoCapture(0)
+        # 重建在后台线程进行，预览定时器不会被卡住
+        self.recon = WorkerSlot(self.on_progress, self.show_points, self.on_failed, self)
+
+        # 摄像头在后台线程读取，定时器只负责刷新预览
+        self.camera = CameraThread(0, preview_size=(400, 300))
+        self.camera.start()
+        self.preview_seq = 0
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
         self.timer.start(30)
 
     def update_frame(self):
-        ret, frame = self.cap.read()
-        if ret:
-            img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # 预览已在采集线程中缩小并转成 RGB，这里直接包成 QImage，没有新帧时跳过
+        with self.camera.preview() as (img_rgb, seq):
+            if img_rgb is None or seq == self.preview_seq:
+                return
             h, w, ch = img_rgb.shape
-            qt_img = QImage(img_rgb.data, w, h, ch*w, QImage.Format_RGB888)
-            pixmap = QPixmap.fromImage(qt_img).scaled(400, 300, Qt.KeepAspectRatio)
-            self.cam_label.setPixmap(pixmap)
-            self.current_frame = frame
+            qt_img = QImage(img_rgb.data, w, h, img_rgb.strides[0], QImage.Format_RGB888)
+            self.cam_label.setPixmap(QPixmap.fromImage(qt_img))
+            self.preview_seq = seq
 
     def capture_face(self):
-        if hasattr(self, 'current_frame'):
-            self.images[self.current_face] = self.current_frame.copy()
+        # 直接取缓冲区中最新的一帧，不等待摄像头
+        frame = self.camera.latest()
+        if frame is not None:
+            self.images[self.current_face] = frame
             self.current_face += 1
             if self.current_face < 6:
                 self.btn_capture.setText("拍摄 {}面".format(face_names[self.current_face]))
@@ -59,41 +79,53 @@ class MainWindow(QWidget):
                 self.btn_capture.setEnabled(False)
                 self.btn_voxel.setEnabled(True)
 
-    def get_mask(self, img):
-        # 简单阈值抠图，假设背景为白色
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, mask = cv2.threshold(gray, 220, 255, cv2.THRESH_BINARY_INV)
-        return mask // 255  # 0/1
-
     def voxel_reconstruct(self):
-        N = 128  # 分辨率
-        voxel = np.ones((N, N, N), dtype=bool)
-        # 预处理图片为N*N
-        masks = []
-        for img in self.images:
-            img = cv2.resize(img, (N, N))
-            mask = self.get_mask(img)
-            masks.append(mask)
-        # 前后
-        for z in range(N):
-            voxel[:, :, z] &= masks[0][:, z]
-            voxel[:, :, z] &= masks[1][:, N-1-z]
-        # 左右
-        for x in range(N):
-            voxel[x, :, :] &= masks[2][:, x][:, None]
-            voxel[x, :, :] &= masks[3][:, N-1-x][:, None]
-        # 上下
-        for y in range(N):
-            voxel[:, y, :] &= masks[4][y, :]
-            voxel[:, y, :] &= masks[5][N-1-y, :]
-        points = np.argwhere(voxel)
-        points = points / N  # 归一化
+        # 重建过程中再次点击会取消当前任务并用最新的照片重新开始
+        # 白底阈值抠图、按位打包雕刻、取点并归一化，见 reconstruct.py
+        stages = build_stages(VOXEL_N, mode='points', mask='threshold', sparse=SPARSE_CARVE, smoothing=False)
+
+        def save(points):
+            write_points('voxel_output.ply', points)
+            return points
+
+        self.metrics = Metrics(enabled=METRICS, profile=PROFILE)
+        self.recon.start(stages + [('保存', save)], list(self.images), self.metrics)
+        self.btn_cancel.setEnabled(True)
+        # 重建的同时可以拍下一组，新照片不影响正在进行的重建；
+        # 六面拍齐之前不能再点重建，否则会把上一组和这一组的照片混在一起
+        self.images = [None]*6
+        self.current_face = 0
+        self.btn_voxel.setEnabled(False)
+        self.btn_capture.setText("重新拍摄 {}面".format(face_names[self.current_face]))
+        self.btn_capture.setEnabled(True)
+
+    def cancel_reconstruct(self):
+        self.recon.cancel()
+        self.btn_cancel.setEnabled(False)
+        self.status_label.setText("已取消")
+
+    def on_progress(self, i, total, name):
+        self.status_label.setText("重建中 {}/{}：{}".format(i, total, name))
+
+    def on_failed(self, msg):
+        self.btn_cancel.setEnabled(False)
+        self.status_label.setText("重建失败：" + msg)
+
+    def show_points(self, points):
+        self.btn_cancel.setEnabled(False)
+        self.status_label.setText("重建完成")
+        if self.metrics.enabled:
+            print(self.metrics.summary())
+        print('点云已保存为 voxel_output.ply')
         # 可视化
         pcd = o3d.geometry.PointCloud()
         pcd.points = o3d.utility.Vector3dVector(points)
         o3d.visualization.draw_geometries([pcd], window_name='体素重建点云')
-        o3d.io.write_point_cloud('voxel_output.ply', pcd)
-        print('点云已保存为 voxel_output.ply')
+
+    def closeEvent(self, event):
+        self.recon.shutdown()
+        self.camera.stop()
+        super().closeEvent(event)
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
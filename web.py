@@ -1,17 +1,67 @@
+import base64
+import binascii
+import hashlib
+import io
+import json
 import os
-from flask import Flask, request, render_template_string, send_from_directory, redirect, url_for, flash
+import re
+import threading
+import time
+from flask import Flask, Response, request, g, render_template_string, send_from_directory, send_file, redirect, url_for, flash, abort
+from werkzeug.exceptions import RequestEntityTooLarge
 from datetime import datetime
+from upload_index import UploadIndex
+from blobstore import BlobStore
+from jobs import JobQueue
+from variants import VariantCache
+from archive import TarStream
+from metrics import Metrics, Histogram
+from upload_stream import receive_files, InflateStream, ENCODINGS
+from resumable import ResumableUploads, OffsetMismatch
+from changefeed import ChangeFeed
 
 UPLOAD_FOLDER = 'uploads2'
+RESULT_FOLDER = 'results2'
+VARIANT_FOLDER = 'variants2'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp'}
+MAX_FILE_SIZE = 64 * 1024 * 1024  # 单张图片上限，超出返回 413
+MAX_REQUEST_SIZE = 2 * 1024 ** 3  # 单次上传请求上限
+MAX_JSON_BATCH = 64 * 1024 * 1024  # JSON 批量上传整体读入内存，单独限制
+FEED_MAX_WAIT = 10  # 长轮询最长等待秒数
+SSE_KEEPALIVE = 15  # SSE 无事件时发送注释行的间隔秒数
+SSE_MAX_AGE = 300  # SSE 连接最长保持秒数，到时断开由客户端带 Last-Event-ID 重连
+# 等待中的长轮询和 SSE 连接各占一个服务器线程，超过上限返回 503，不挤占上传和下载
+MAX_SUBSCRIBERS = int(os.environ.get('WEB_MAX_SUBSCRIBERS', '4'))
+# 设 WEB_METRICS=0 关闭请求计时和上传计数，/metrics 只剩存储占用
+WEB_METRICS = os.environ.get('WEB_METRICS', '1') != '0'
 
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# 存储目录相对当前目录；send_from_directory 会把相对路径解析到程序所在目录，所以存绝对路径
+app.config['UPLOAD_FOLDER'] = os.path.abspath(UPLOAD_FOLDER)
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_SIZE
 app.secret_key = 'your_secret_key2'
 
+# 上传目录的元数据索引，列表接口和页面都从这里读，不再逐个 stat
+upload_index = UploadIndex(UPLOAD_FOLDER)
+# 按内容哈希去重的存储，文件名是指向内容的硬链接
+blob_store = BlobStore(UPLOAD_FOLDER)
+# 服务端重建任务，结果按图片集合哈希+参数缓存
+job_queue = JobQueue(RESULT_FOLDER)
+# 缩小版本图片缓存，客户端只取需要的分辨率
+variant_cache = VariantCache(VARIANT_FOLDER)
+# 分块续传的上传会话，存在上传目录的 .partial 下
+resumable_uploads = ResumableUploads(UPLOAD_FOLDER, blob_store)
+# 上传、清空事件流，客户端据此只处理新到的图片
+change_feed = ChangeFeed()
+subscriber_slots = threading.BoundedSemaphore(MAX_SUBSCRIBERS)
+# /metrics 的数据：各接口的处理耗时直方图和上传计数
+request_latency = Histogram('web_request_duration_seconds', '请求处理耗时（秒），流式响应只计到开始发送',
+                            ('endpoint', 'method', 'code'))
+upload_stats = Metrics(enabled=WEB_METRICS)
+
 HTML = '''
 <!doctype html>
 <html lang="zh">
@@ -224,13 +274,12 @@ HTML = '''
         
         <div class="file-list">
             <h2>已上传图片</h2>
-            {% for filename in files %}
-                {% set filepath = os.path.join(upload_folder, filename) %}
+            {% for f in files %}
                 <div class="file-item">
-                    <a href="/uploads/{{ filename }}" class="file-link">{{ filename }}</a>
+                    <a href="/uploads/{{ f.name }}" class="file-link">{{ f.name }}</a>
                     <div class="file-info">
-                        <span>{{ (os.path.getsize(filepath)/1024)|round(1) }} KB</span>
-                        <span>{{ datetime.fromtimestamp(os.path.getmtime(filepath)).strftime('%Y-%m-%d %H:%M') }}</span>
+                        <span>{{ (f.size/1024)|round(1) }} KB</span>
+                        <span>{{ datetime.fromtimestamp(f.mtime).strftime('%Y-%m-%d %H:%M') }}</span>
                     </div>
                 </div>
             {% endfor %}
@@ -240,6 +289,11 @@ HTML = '''
             <div class="api-title">下载接口：</div>
             <div>表：<span class="api-code">/api/list</span></div>
             <div>片：<span class="api-code">/api/download/&lt;文件名&gt;</span></div>
+            <div>打包：<span class="api-code">/api/archive?since=&lt;时间戳&gt;</span></div>
+            <div>重建：<span class="api-code">POST /api/jobs</span>，<span class="api-code">/api/jobs/&lt;任务id&gt;/result</span></div>
+            <div>上传：<span class="api-code">POST /api/upload</span>（multipart 或 JSON 批量），<span class="api-code">POST /api/resumable</span> + <span class="api-code">PATCH /api/resumable/&lt;id&gt;</span>（分块续传）</div>
+            <div>变更：<span class="api-code">/api/changes?since=&lt;序号&gt;&amp;timeout=&lt;秒&gt;</span>（长轮询），<span class="api-code">/api/events</span>（SSE）</div>
+            <div>监控：<span class="api-code">/metrics</span>（Prometheus 文本，<span class="api-code">?format=json</span> 为 JSON）</div>
         </div>
     </div>
     
@@ -264,37 +318,129 @@ HTML = '''
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def upload_name(filename):
+    """客户端给出的文件名去掉目录部分；空名、./..、以 . 开头或含控制字符时返回 None
+
+    保留中文等非 ASCII 字符，所以不用 secure_filename。
+    """
+    name = re.split(r'[/\\]', filename or '')[-1].strip()
+    if not name or name.startswith('.') or any(ord(c) < 32 for c in name):
+        return None
+    return name
+
+def accept_upload(filename):
+    name = upload_name(filename)
+    return name is not None and allowed_file(name)
+
+if WEB_METRICS:
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            labels = (request.endpoint or 'unmatched', request.method, str(response.status_code))
+            request_latency.observe(labels, time.perf_counter() - start)
+        return response
+
+def publish_upload(name):
+    entry = upload_index.get(name, with_hash=True)
+    change_feed.publish('upload', name=name, hash=entry['hash'], size=entry['size'], mtime=entry['mtime'])
+
+def save_upload(filename, digest):
+    """把已存入 blob 的内容登记为上传文件，返回 {name, hash, status}
+
+    文件名在这里统一清理，不合法或类型不支持时 status 为 rejected，不写任何文件。
+    """
+    filename = upload_name(filename)
+    if filename is None or not allowed_file(filename):
+        return {'name': None, 'hash': digest, 'status': 'rejected'}
+    # 与清空互斥：内容提交之后、登记之前存储被清空时，status 为 cleared，客户端重新上传
+    with blob_store.lock:
+        if not os.path.exists(blob_store.blob_path(digest)):
+            return {'name': None, 'hash': digest, 'status': 'cleared'}
+        existing = upload_index.get(filename, with_hash=True)
+        if existing and existing['hash'] == digest:
+            # 同名同内容的重复上传，不再生成新文件名
+            upload_stats.count('duplicates')
+            return {'name': filename, 'hash': digest, 'status': 'duplicate'}
+        # 防止重名，自动编号
+        save_name = upload_index.allocate(filename)
+        try:
+            blob_store.link(digest, save_name)
+        except BaseException:
+            upload_index.release(save_name)
+            raise
+        upload_index.add(save_name, digest)
+        publish_upload(save_name)
+    return {'name': save_name, 'hash': digest, 'status': 'saved'}
+
+def request_body():
+    """请求体流；客户端压缩上传（Content-Encoding: gzip/deflate）时边读边解压"""
+    encoding = request.headers.get('Content-Encoding', 'identity').strip().lower()
+    if encoding == 'identity':
+        return request.stream
+    if encoding not in ENCODINGS:
+        abort(415)
+    return InflateStream(request.stream, encoding, limit=MAX_REQUEST_SIZE)
+
+def multipart_boundary():
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        abort(400)
+    return boundary.encode('latin-1')
+
 @app.route('/', methods=['GET', 'POST'])
 def upload_file():
     if request.method == 'POST':
-        files = request.files.getlist('photos')
         saved = 0
-        for file in files:
-            if file and allowed_file(file.filename):
-                # 防止重名，自动编号
-                base, ext = os.path.splitext(file.filename)
-                save_name = file.filename
-                i = 1
-                while os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], save_name)):
-                    save_name = f"{base}_{i}{ext}"
-                    i += 1
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], save_name))
-                saved += 1
-        flash(f'成功上传 {saved} 张图片！')
+        duplicated = 0
+        # 边收请求体边解析，每个文件分块写进 blob 存储并算哈希，相同内容只保存一份
+        files = receive_files(request_body(), multipart_boundary(), blob_store,
+                              lambda field, filename: field == 'photos' and accept_upload(filename),
+                              max_file_size=MAX_FILE_SIZE)
+        try:
+            for filename, digest, size, error in files:
+                if error == 'rejected':
+                    continue
+                if error == 'too_large':
+                    raise RequestEntityTooLarge(f'{filename} 超过单个文件上限 {MAX_FILE_SIZE} 字节')
+                status = save_upload(filename, digest)['status']
+                if status in ('rejected', 'cleared'):
+                    continue
+                upload_stats.count('files')
+                upload_stats.count('bytes', size)
+                if status == 'duplicate':
+                    duplicated += 1
+                else:
+                    saved += 1
+        except ValueError:
+            # multipart 格式错误或请求体不完整
+            abort(400)
+        if duplicated:
+            flash(f'成功上传 {saved} 张图片！另有 {duplicated} 张与已有图片相同，已跳过。')
+        else:
+            flash(f'成功上传 {saved} 张图片！')
         return redirect(url_for('upload_file'))
     
-    files = []
-    if os.path.exists(app.config['UPLOAD_FOLDER']):
-        files = sorted(os.listdir(app.config['UPLOAD_FOLDER']), reverse=True)
-    return render_template_string(HTML, files=files, os=os, datetime=datetime, upload_folder=app.config['UPLOAD_FOLDER'])
+    files, _ = upload_index.list(sort='name', reverse=True)
+    return render_template_string(HTML, files=files, datetime=datetime)
 
 @app.route('/clear', methods=['POST'])
 def clear_images():
-    files = os.listdir(app.config['UPLOAD_FOLDER'])
-    for f in files:
-        path = os.path.join(app.config['UPLOAD_FOLDER'], f)
-        if os.path.isfile(path):
-            os.remove(path)
+    # 持有存储锁，进行中的上传要么在清空前登记完，要么在清空后得到 cleared
+    with blob_store.lock:
+        files = os.listdir(app.config['UPLOAD_FOLDER'])
+        for f in files:
+            path = os.path.join(app.config['UPLOAD_FOLDER'], f)
+            if os.path.isfile(path):
+                os.remove(path)
+        blob_store.clear()
+        upload_index.clear()
+    resumable_uploads.clear()
+    change_feed.publish('clear')
     flash('所有图片已清空！')
     return redirect(url_for('upload_file'))
 
@@ -302,16 +448,358 @@ def clear_images():
 def download_file(filename):
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
-# API接口：列出所有图片
+# API接口：列出所有图片，items 中附带大小、修改时间和内容哈希
+# 可选参数：sort=name|mtime|size，order=asc|desc，since=时间戳，offset，limit
 @app.route('/api/list')
 def api_list():
-    files = os.listdir(app.config['UPLOAD_FOLDER'])
-    return {'files': files}
+    try:
+        sort = request.args.get('sort', 'name')
+        reverse = request.args.get('order', 'asc') == 'desc'
+        since = request.args.get('since', type=float)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit < 1:
+            # limit=0 时 next_offset 不前进，按它翻页的客户端会死循环
+            raise ValueError('limit 必须大于0')
+        items, total = upload_index.list(sort=sort, reverse=reverse, since=since,
+                                         offset=offset, limit=limit, with_hash=True)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    resp = {'files': [e['name'] for e in items], 'items': items, 'total': total, 'offset': offset}
+    if limit is not None and offset + len(items) < total:
+        resp['next_offset'] = offset + len(items)
+    return resp
 
-# API接口：下载图片
+# API接口：下载图片，ETag 为内容哈希，支持 If-None-Match 返回 304
+# 可选参数 max_side=最长边像素 或 scale=缩放比例，返回缩小后的图片
 @app.route('/api/download/<filename>')
 def api_download(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    entry = upload_index.get(filename, with_hash=True)
+    if entry is None:
+        abort(404)
+    max_side = request.args.get('max_side', type=int)
+    scale = request.args.get('scale', type=float)
+    if max_side is None and scale is None:
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename, etag=entry['hash'])
+    src = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    try:
+        path, etag = variant_cache.get(src, entry['hash'], max_side=max_side, scale=scale)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    if path is None:
+        # 结果文件已被删除
+        abort(404)
+    return send_file(os.path.abspath(path), etag=etag, download_name=filename)
+
+# API接口：把一组图片打成一个 tar 流式返回，支持 Range/If-Range 断点续传
+# 参数 file=文件名(可重复) 或 since=时间戳；POST 时也可用 JSON {"files": [...], "since": ...}
+@app.route('/api/archive', methods=['GET', 'POST'])
+def api_archive():
+    params = request.get_json(silent=True) or {}
+    if not isinstance(params, dict):
+        return {'error': '参数必须是 JSON 对象'}, 400
+    names = params.get('files') or request.args.getlist('file')
+    if not (isinstance(names, list) and all(isinstance(n, str) for n in names)):
+        return {'error': 'files 必须是文件名列表'}, 400
+    since = params.get('since', request.args.get('since', type=float))
+    if since is not None and (isinstance(since, bool) or not isinstance(since, (int, float))):
+        return {'error': 'since 必须是时间戳'}, 400
+    if names:
+        entries = [upload_index.get(n, with_hash=True) for n in names]
+        missing = [n for n, e in zip(names, entries) if e is None]
+        if missing:
+            return {'error': '文件不存在', 'missing': missing}, 404
+    else:
+        entries, _ = upload_index.list(sort='name', since=since, with_hash=True)
+    stream = TarStream([(e['name'], os.path.join(app.config['UPLOAD_FOLDER'], e['name']),
+                         e['size'], e['mtime'], e['hash']) for e in entries])
+    start, stop, status = 0, stream.length, 200
+    if request.range is not None:
+        # If-Range 与当前归档不一致时（文件集合变了）忽略 Range，重新发整个包
+        if_range = request.if_range
+        if (if_range.etag is None and if_range.date is None) or if_range.etag == stream.etag:
+            span = request.range.range_for_length(stream.length)
+            if span is None:
+                return Response(status=416, headers={'Content-Range': f'bytes */{stream.length}'})
+            start, stop = span
+            status = 206
+    resp = Response(stream.iter_range(start, stop), status=status, mimetype='application/x-tar')
+    resp.headers['Content-Length'] = str(stop - start)
+    resp.headers['Accept-Ranges'] = 'bytes'
+    resp.headers['Content-Disposition'] = 'attachment; filename=uploads.tar'
+    resp.set_etag(stream.etag)
+    if status == 206:
+        resp.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{stream.length}'
+    return resp
+
+# API接口：提交重建任务，JSON 参数 files(默认全部图片)、step、z_scale
+@app.route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    params = request.get_json(silent=True) or {}
+    names = params.get('files')
+    if names is not None and not (isinstance(names, list) and all(isinstance(n, str) for n in names)):
+        return {'error': 'files 必须是文件名列表'}, 400
+    if names is None:
+        entries, _ = upload_index.list(sort='name', with_hash=True)
+    else:
+        entries = [upload_index.get(n, with_hash=True) for n in names]
+        missing = [n for n, e in zip(names, entries) if e is None]
+        if missing:
+            return {'error': '文件不存在', 'missing': missing}, 404
+    entries = [e for e in entries if allowed_file(e['name'])]
+    if not entries:
+        return {'error': '没有可重建的图片'}, 400
+    try:
+        step = int(params.get('step', 18))
+        z_scale = float(params.get('z_scale', 50.0))
+    except (TypeError, ValueError):
+        return {'error': 'step/z_scale 参数无效'}, 400
+    if step < 1:
+        return {'error': 'step 必须大于0'}, 400
+    paths = [os.path.join(app.config['UPLOAD_FOLDER'], e['name']) for e in entries]
+    job_id, status = job_queue.submit(paths, [e['hash'] for e in entries], step, z_scale)
+    return dict(status, job_id=job_id), 200 if status['status'] == 'done' else 202
+
+# API接口：查询任务状态
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    status = job_queue.status(job_id)
+    if status is None:
+        abort(404)
+    return dict(status, job_id=job_id)
+
+# API接口：下载任务结果，format=npy|ply|csv|npz
+@app.route('/api/jobs/<job_id>/result')
+def api_job_result(job_id):
+    status = job_queue.status(job_id)
+    if status is None:
+        abort(404)
+    if status['status'] != 'done':
+        return dict(status, job_id=job_id), 409
+    try:
+        path = job_queue.result_file(job_id, request.args.get('format', 'npy'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    if path is None:
+        # 结果文件已被删除
+        abort(404)
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=os.path.basename(path))
+
+def batch_json():
+    """JSON 批量上传：{"files": [{"name", "data"(base64), "hash"(可选)}]}，逐个返回结果"""
+    if request.content_length is not None and request.content_length > MAX_JSON_BATCH:
+        raise RequestEntityTooLarge()
+    body = request_body().read(MAX_JSON_BATCH + 1)
+    if len(body) > MAX_JSON_BATCH:
+        raise RequestEntityTooLarge()
+    try:
+        files = json.loads(body)['files']
+    except (ValueError, KeyError, TypeError):
+        abort(400)
+    if not isinstance(files, list):
+        abort(400)
+    for item in files:
+        name = item.get('name') if isinstance(item, dict) else None
+        if not isinstance(name, str) or not accept_upload(name):
+            yield {'filename': name, 'status': 'rejected'}
+            continue
+        try:
+            data = base64.b64decode(item.get('data') or '', validate=True)
+        except (binascii.Error, TypeError):
+            yield {'filename': name, 'status': 'invalid', 'error': 'data 不是有效的 base64'}
+            continue
+        if len(data) > MAX_FILE_SIZE:
+            yield {'filename': name, 'status': 'too_large', 'size': len(data)}
+            continue
+        if item.get('hash'):
+            # 先核对再入库，不符的内容不留在 blob 存储里
+            actual = hashlib.sha256(data).hexdigest()
+            if actual != item['hash']:
+                yield {'filename': name, 'status': 'hash_mismatch', 'hash': actual}
+                continue
+        digest, _ = blob_store.put_stream(io.BytesIO(data))
+        yield dict(save_upload(name, digest), filename=name, size=len(data))
+
+def batch_multipart():
+    files = receive_files(request_body(), multipart_boundary(), blob_store,
+                          lambda field, filename: accept_upload(filename), max_file_size=MAX_FILE_SIZE)
+    for filename, digest, size, error in files:
+        if error:
+            yield {'filename': filename, 'status': error, 'size': size}
+        else:
+            yield dict(save_upload(filename, digest), filename=filename, size=size)
+
+# API接口：批量上传，multipart（任意字段名，可多文件）或 JSON，返回每个文件的结果
+# status 为 saved/duplicate/rejected/too_large/invalid/hash_mismatch/cleared（上传途中存储被清空，需重传）；
+# 请求体可用 gzip/deflate 压缩
+@app.route('/api/upload', methods=['POST'])
+def api_upload():
+    results = []
+    try:
+        for r in (batch_json() if request.is_json else batch_multipart()):
+            if r['status'] in ('saved', 'duplicate'):
+                upload_stats.count('files')
+                upload_stats.count('bytes', r['size'])
+            results.append(r)
+    except ValueError:
+        # multipart 格式错误、请求体不完整或压缩数据无效
+        abort(400)
+    counts = {}
+    for r in results:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+    return {'files': results, 'counts': counts}
+
+# API接口：创建分块续传会话，JSON {"name", "size", "hash"(可选 sha256，收齐后校验)}
+# 内容必须真正传上来：只凭哈希登记已有内容，等于让知道哈希的人取得别人上传的图片
+@app.route('/api/resumable', methods=['POST'])
+def api_resumable_create():
+    params = request.get_json(silent=True) or {}
+    name = params.get('name')
+    size = params.get('size')
+    digest = params.get('hash')
+    if not isinstance(name, str) or not accept_upload(name):
+        return {'error': '文件名无效或类型不支持'}, 400
+    name = upload_name(name)
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+        return {'error': 'size 必须是非负整数'}, 400
+    if size > MAX_FILE_SIZE:
+        return {'error': f'超过单个文件上限 {MAX_FILE_SIZE} 字节'}, 413
+    if digest is not None and not (isinstance(digest, str) and re.fullmatch(r'[0-9a-f]{64}', digest)):
+        return {'error': 'hash 必须是小写十六进制的 sha256'}, 400
+    upload_id = resumable_uploads.create(name, size, digest)
+    if size == 0:
+        return resumable_finish(upload_id, name, 0)
+    url = url_for('api_resumable', upload_id=upload_id)
+    return {'id': upload_id, 'url': url, 'offset': 0, 'size': size, 'complete': False}, 201, {'Location': url}
+
+def resumable_finish(upload_id, name, offset):
+    try:
+        digest, _ = resumable_uploads.finish(upload_id)
+    except KeyError:
+        # 两个请求同时追加到末尾，另一个已经入库并删掉了会话
+        abort(404)
+    except ValueError as e:
+        return {'error': str(e), 'complete': False}, 422
+    result = save_upload(name, digest)
+    if result['status'] == 'cleared':
+        return dict(result, error='存储已被清空，请重新上传', complete=False), 410
+    upload_stats.count('files')
+    return dict(result, complete=True, offset=offset, size=offset)
+
+# API接口：查询（GET/HEAD）、追加（PATCH，Upload-Offset 头给出本块起始偏移）、放弃（DELETE）续传会话
+# 偏移不一致返回 409 和服务端偏移；收齐后自动入库，返回与批量上传相同的结果
+@app.route('/api/resumable/<upload_id>', methods=['GET', 'PATCH', 'DELETE'])
+def api_resumable(upload_id):
+    info = resumable_uploads.get(upload_id)
+    if info is None:
+        abort(404)
+    if request.method == 'GET':
+        info['complete'] = False
+        return info, 200, {'Upload-Offset': str(info['offset']), 'Cache-Control': 'no-store'}
+    if request.method == 'DELETE':
+        resumable_uploads.abort(upload_id)
+        return '', 204
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return {'error': '缺少 Upload-Offset 头'}, 400
+    try:
+        new_offset = resumable_uploads.append(upload_id, offset, request_body())
+    except OffsetMismatch as e:
+        return {'error': str(e), 'offset': e.offset}, 409, {'Upload-Offset': str(e.offset)}
+    except KeyError:
+        abort(404)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    upload_stats.count('bytes', new_offset - offset)
+    if new_offset < info['size']:
+        return {'offset': new_offset, 'size': info['size'], 'complete': False}, 200, {'Upload-Offset': str(new_offset)}
+    return resumable_finish(upload_id, info['name'], new_offset)
+
+def too_many_subscribers():
+    return {'error': f'订阅连接已达上限 {MAX_SUBSCRIBERS}，请稍后重试'}, 503, {'Retry-After': '5'}
+
+def feed_position():
+    # 长轮询用 feed/since 参数，SSE 重连时浏览器带 Last-Event-ID: <feed>:<序号>
+    feed_id = request.args.get('feed')
+    since = request.args.get('since', type=int)
+    last = request.headers.get('Last-Event-ID', '')
+    if since is None and ':' in last:
+        feed_id, _, seq = last.partition(':')
+        since = int(seq) if seq.isdigit() else None
+    if since is None:
+        # 不带位置时从当前开始，只收之后的事件
+        return change_feed.id, change_feed.seq
+    return feed_id, since
+
+# API接口：变更长轮询，返回 since 之后的上传/清空事件，没有事件时最多等 timeout 秒
+# reset 为 true 表示服务器重启或事件已过期，客户端应重新拉取 /api/list 后从返回的 seq 继续
+@app.route('/api/changes')
+def api_changes():
+    feed_id, since = feed_position()
+    timeout = min(max(request.args.get('timeout', 0, type=float), 0), FEED_MAX_WAIT)
+    if timeout <= 0:
+        events, reset = change_feed.since(since, feed_id)
+    elif subscriber_slots.acquire(blocking=False):
+        try:
+            events, reset = change_feed.since(since, feed_id, timeout)
+        finally:
+            subscriber_slots.release()
+    else:
+        return too_many_subscribers()
+    seq = events[-1]['seq'] if events else (change_feed.seq if reset else since)
+    return {'feed': change_feed.id, 'seq': seq, 'reset': reset, 'events': events}
+
+# API接口：同样的事件以 Server-Sent Events 推送，事件名为 upload/clear/reset
+@app.route('/api/events')
+def api_events():
+    feed_id, since = feed_position()
+    if not subscriber_slots.acquire(blocking=False):
+        return too_many_subscribers()
+
+    def stream(feed_id, seq):
+        yield 'retry: 3000\n\n'
+        deadline = time.monotonic() + SSE_MAX_AGE
+        while time.monotonic() < deadline:
+            events, reset = change_feed.since(seq, feed_id, SSE_KEEPALIVE)
+            if reset:
+                feed_id, seq = change_feed.id, change_feed.seq
+                data = json.dumps({'feed': change_feed.id, 'seq': seq})
+                yield f'id: {change_feed.id}:{seq}\nevent: reset\ndata: {data}\n\n'
+            elif not events:
+                yield ': keepalive\n\n'
+            for e in events:
+                yield f'id: {change_feed.id}:{e["seq"]}\nevent: {e["type"]}\ndata: {json.dumps(e, ensure_ascii=False)}\n\n'
+                seq = e['seq']
+    resp = Response(stream(feed_id, since), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'  # 经过 nginx 时不要缓冲
+    # 连接结束（包括客户端断开）时由服务器关闭响应，归还名额
+    resp.call_on_close(subscriber_slots.release)
+    return resp
+
+# 监控接口：请求耗时直方图、上传文件数和字节数、存储占用
+# 默认 Prometheus 文本格式，format=json 返回 JSON
+@app.route('/metrics')
+def metrics():
+    files, logical = upload_index.usage()
+    blobs, physical = blob_store.usage()
+    uploads = upload_stats.report()['counters']
+    storage = {'files': files, 'bytes': logical, 'blobs': blobs, 'blob_bytes': physical}
+    if request.args.get('format') == 'json':
+        return {'enabled': WEB_METRICS, 'uploads': uploads, 'storage': storage,
+                'requests': request_latency.snapshot()}
+    lines = []
+    for name, kind, value, help_text in (
+            ('web_upload_files_total', 'counter', uploads.get('files', 0), '上传的图片数（含重复）'),
+            ('web_upload_bytes_total', 'counter', uploads.get('bytes', 0), '上传的图片字节数（含重复）'),
+            ('web_upload_duplicates_total', 'counter', uploads.get('duplicates', 0), '同名同内容被跳过的上传数'),
+            ('web_storage_files', 'gauge', files, '已上传的文件数'),
+            ('web_storage_bytes', 'gauge', logical, '按文件名累计的大小'),
+            ('web_storage_blobs', 'gauge', blobs, '去重后的内容数'),
+            ('web_storage_blob_bytes', 'gauge', physical, '去重后实际占用的磁盘字节数')):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {value}']
+    lines += request_latency.exposition()
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file